@@ -0,0 +1,145 @@
+"""JWT bearer authentication.
+
+Verifying a signature on every request is a fixed CPU cost on every
+authenticated route, so verified claims are kept in a small LRU keyed by a
+digest of the token. An entry never outlives the token's ``exp`` (or
+``max_cache_ttl``, whichever is sooner), and the cache is dropped whenever
+the key set changes.
+
+Keys come from ``JWT_KEYS_FILE`` when set, otherwise ``JWT_SECRET`` as a
+single HS256 key. Key objects are prepared once at load time; the keys file
+is re-read when its mtime, size or inode changes, so keys can be rotated without a restart::
+
+    {
+      "keys": {
+        "2024-01": {"alg": "HS256", "secret": "..."},
+        "2024-02": {"alg": "RS256", "public_key": "-----BEGIN PUBLIC KEY-----..."}
+      }
+    }
+
+Tokens select a key with their ``kid`` header; tokens without one use the
+``default`` key.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KID = "default"
+CACHE_SIZE = 4096
+MAX_CACHE_TTL = 300
+RELOAD_INTERVAL = 5
+
+bearer = HTTPBearer(auto_error=False)
+
+
+def prepare_keys(spec):
+    """Turn ``{kid: {"alg": ..., "secret"|"public_key": ...}}`` into key objects."""
+    algorithms = jwt.algorithms.get_default_algorithms()
+    keys = {}
+    for kid, entry in spec.items():
+        alg = entry["alg"]
+        material = entry.get("secret") or entry.get("public_key")
+        keys[kid] = (alg, algorithms[alg].prepare_key(material))
+    return keys
+
+
+class Authenticator:
+    def __init__(self, keys=None, keys_file=None, cache_size=CACHE_SIZE, max_cache_ttl=MAX_CACHE_TTL,
+                 audience=None, issuer=None, leeway=0, reload_interval=RELOAD_INTERVAL):
+        self.keys_file = keys_file
+        self.max_cache_ttl = max_cache_ttl
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.reload_interval = reload_interval
+        self.cache = LRUCache(cache_size)
+        self._keys = {}
+        self._keys_version = None
+        self._next_reload = 0.0
+        if keys is not None:
+            self.set_keys(keys)
+        elif keys_file:
+            self.reload()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        keys_file = os.environ.get("JWT_KEYS_FILE")
+        if keys_file:
+            return cls(keys_file=keys_file, **kwargs)
+        secret = os.environ.get("JWT_SECRET")
+        keys = prepare_keys({DEFAULT_KID: {"alg": "HS256", "secret": secret}}) if secret else {}
+        return cls(keys=keys, **kwargs)
+
+    def set_keys(self, keys):
+        self._keys = keys
+        # Claims verified under the old key set may no longer be valid.
+        self.cache.clear()
+
+    def reload(self):
+        # mtime alone misses two rewrites within one timestamp tick; an
+        # atomic rename always changes the inode.
+        st = os.stat(self.keys_file)
+        version = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if version == self._keys_version:
+            return
+        with open(self.keys_file) as f:
+            spec = json.load(f)["keys"]
+        self.set_keys(prepare_keys(spec))
+        self._keys_version = version
+
+    def _maybe_reload(self, now):
+        if self.keys_file and now >= self._next_reload:
+            self._next_reload = now + self.reload_interval
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError):
+                # A rotation in progress can leave the file missing or
+                # half-written; keep serving with the keys we have.
+                logger.warning("Could not reload %s, keeping current keys", self.keys_file, exc_info=True)
+
+    def verify(self, token):
+        """Return the claims of a valid token or raise ``jwt.InvalidTokenError``."""
+        now = time.monotonic()
+        self._maybe_reload(now)
+        digest = hashlib.blake2b(token.encode(), digest_size=20).digest()
+        claims = self.cache.get(digest)
+        if claims is not None:
+            return claims
+
+        kid = jwt.get_unverified_header(token).get("kid", DEFAULT_KID)
+        try:
+            alg, key = self._keys[kid]
+        except KeyError:
+            raise jwt.InvalidTokenError(f"Unknown key id: {kid}") from None
+        claims = jwt.decode(
+            token, key, algorithms=[alg], audience=self.audience, issuer=self.issuer,
+            leeway=self.leeway, options={"require": ["exp"]},
+        )
+        ttl = min(claims["exp"] - time.time(), self.max_cache_ttl)
+        if ttl > 0:
+            self.cache.set(digest, claims, ttl)
+        return claims
+
+    async def __call__(self, credentials: HTTPAuthorizationCredentials | None = Depends(bearer)):
+        if credentials is None:
+            raise HTTPException(
+                status.HTTP_401_UNAUTHORIZED, "Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        try:
+            return self.verify(credentials.credentials)
+        except jwt.InvalidTokenError as exc:
+            raise HTTPException(
+                status.HTTP_401_UNAUTHORIZED, str(exc),
+                headers={"WWW-Authenticate": 'Bearer error="invalid_token"'},
+            ) from None
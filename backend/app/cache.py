@@ -0,0 +1,380 @@
+"""Two-tier response cache: an in-process LRU in front of Redis.
+
+Routes opt in with the ``cached`` decorator::
+
+    @app.get("/lessons")
+    @cache.cached(ttl=60, tags=["lessons"])
+    async def lessons(): ...
+
+Keys are built from method, path, sorted query string and the caller's auth
+scope, so two users never share an entry for authenticated routes.
+Concurrent misses for the same key are collapsed into a single computation,
+responses carry an ETag and conditional requests get a 304.
+
+The local tier is per worker. ``invalidate`` clears it in the calling worker
+and in Redis, and announces the tags on a Redis pub/sub channel; every
+worker that called ``start`` listens there and drops its own local copies.
+A listener that loses its subscription clears its local tier when it
+resubscribes, since it may have missed invalidations meanwhile. Tag membership
+is kept in Redis sorted sets scored by expiry, so members are pruned as
+entries expire and the sets themselves expire with their last entry.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cache:"
+TAG_PREFIX = "cache-tag:"
+INVALIDATE_CHANNEL = "cache-invalidate"
+
+
+class _LeaderCancelled(Exception):
+    """Raised to single-flight waiters when the computing request is cancelled."""
+
+
+class CacheEntry:
+    __slots__ = ("body", "media_type", "status_code", "etag", "tags")
+
+    def __init__(self, body, media_type, status_code, etag, tags=()):
+        self.body = body
+        self.media_type = media_type
+        self.status_code = status_code
+        self.etag = etag
+        self.tags = tuple(tags)
+
+    def dumps(self):
+        header = json.dumps({
+            "media_type": self.media_type,
+            "status_code": self.status_code,
+            "etag": self.etag,
+            "tags": self.tags,
+        }).encode()
+        return header + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data):
+        header, _, body = data.partition(b"\n")
+        meta = json.loads(header)
+        return cls(body, meta["media_type"], meta["status_code"], meta["etag"], meta["tags"])
+
+
+class LRUCache:
+    """Size-bounded LRU with a per-entry TTL.
+
+    Only touched from the event loop thread, so it needs no locking.
+    ``on_evict(key, value)`` is called whenever an entry leaves the cache,
+    whether it expired, was pushed out, replaced or deleted.
+    """
+
+    def __init__(self, max_entries=1024, clock=time.monotonic, on_evict=None):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+
+    def _evicted(self, key, item):
+        if self.on_evict is not None:
+            self.on_evict(key, item[1])
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= self.clock():
+            del self._data[key]
+            self._evicted(key, item)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._evicted(key, old)
+        self._data[key] = (self.clock() + ttl, value)
+        while len(self._data) > self.max_entries:
+            self._evicted(*self._data.popitem(last=False))
+
+    def delete(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._evicted(key, item)
+
+    def clear(self):
+        items, self._data = self._data, OrderedDict()
+        for key, item in items.items():
+            self._evicted(key, item)
+
+
+def auth_scope(request):
+    """Default scope: a digest of the Authorization header, or ``anon``."""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return "anon"
+    return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, redis=None, max_entries=1024, ttl=60, local_ttl=None, scope=auth_scope):
+        self.redis = redis
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.scope = scope
+        self.local = LRUCache(max_entries, on_evict=self._untag)
+        self._tags = {}
+        self._inflight = {}
+        self._id = os.urandom(8).hex()
+        self._listener = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        url = os.environ.get("REDIS_URL")
+        client = None
+        if url:
+            import redis.asyncio
+
+            client = redis.asyncio.from_url(url)
+        return cls(redis=client, **kwargs)
+
+    async def start(self):
+        """Start following other workers' invalidations; a no-op without Redis.
+
+        Returns once the first subscription attempt has finished, so entries
+        cached after startup are covered.
+        """
+        if self.redis is None or self._listener is not None:
+            return
+        subscribed = asyncio.get_running_loop().create_future()
+        self._listener = asyncio.create_task(self._listen(subscribed))
+        await subscribed
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    async def _listen(self, subscribed):
+        delay = 0.1
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Anything cached while unsubscribed may have been
+                # invalidated elsewhere without us hearing about it.
+                self.local.clear()
+                if not subscribed.done():
+                    subscribed.set_result(None)
+                delay = 0.1
+                async for message in pubsub.listen():
+                    self._on_invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cache invalidation listener failed, retrying in %.1fs", delay, exc_info=True)
+                if not subscribed.done():
+                    subscribed.set_result(None)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            finally:
+                await pubsub.aclose()
+
+    def _on_invalidate(self, data):
+        message = json.loads(data)
+        if message["from"] != self._id:
+            self._drop_local(message["tags"])
+
+    def _drop_local(self, tags, keys=()):
+        keys = set(keys)
+        for tag in tags:
+            keys |= self._tags.pop(tag, set())
+        for key in keys:
+            self.local.delete(key)
+
+    def key_for(self, request):
+        query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+        raw = f"{request.method}:{request.url.path}?{query}#{self.scope(request)}"
+        return KEY_PREFIX + hashlib.sha256(raw.encode()).hexdigest()
+
+    def _untag(self, key, entry):
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _store_local(self, key, entry, ttl):
+        local_ttl = min(ttl, self.local_ttl) if self.local_ttl else ttl
+        self.local.set(key, entry, local_ttl)
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    async def get(self, key):
+        entry = self.local.get(key)
+        if entry is not None or self.redis is None:
+            return entry
+        try:
+            data, ttl = await self.redis.pipeline(transaction=False).get(key).pttl(key).execute()
+        except Exception:
+            logger.warning("Redis cache read failed", exc_info=True)
+            return None
+        if data is None:
+            return None
+        entry = CacheEntry.loads(data)
+        self._store_local(key, entry, ttl / 1000 if ttl > 0 else self.ttl)
+        return entry
+
+    async def set(self, key, entry, ttl=None):
+        ttl = ttl or self.ttl
+        self._store_local(key, entry, ttl)
+        if self.redis is None:
+            return
+        ttl_ms = int(ttl * 1000)
+        now_ms = int(time.time() * 1000)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(key, entry.dumps(), px=ttl_ms)
+            for tag in entry.tags:
+                tag_key = TAG_PREFIX + tag
+                # Score members by expiry so dead keys can be dropped, and
+                # keep the set alive exactly as long as its newest entry.
+                pipe.zadd(tag_key, {key: now_ms + ttl_ms})
+                pipe.zremrangebyscore(tag_key, "-inf", now_ms)
+                pipe.pexpire(tag_key, ttl_ms, nx=True)
+                pipe.pexpire(tag_key, ttl_ms, gt=True)
+            await pipe.execute()
+        except Exception:
+            logger.warning("Redis cache write failed", exc_info=True)
+
+    async def invalidate(self, *tags):
+        if not tags:
+            return
+        keys = set()
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for tag in tags:
+                    pipe.zrange(TAG_PREFIX + tag, 0, -1)
+                for members in await pipe.execute():
+                    keys |= {m.decode() if isinstance(m, bytes) else m for m in members}
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.delete(*keys, *(TAG_PREFIX + tag for tag in tags))
+                pipe.publish(INVALIDATE_CHANNEL, json.dumps({"from": self._id, "tags": tags}))
+                await pipe.execute()
+            except Exception:
+                logger.warning("Redis cache invalidation failed", exc_info=True)
+        self._drop_local(tags, keys)
+
+    async def get_or_compute(self, key, compute, ttl=None):
+        """Return the cached entry for ``key`` or build it with ``compute``.
+
+        Concurrent callers for the same missing key wait on one computation
+        instead of each hitting the handler.
+        """
+        while True:
+            entry = self.local.get(key)
+            if entry is not None:
+                return entry
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # The caller computing the value went away; retry, and one
+                # of the waiters takes over the computation.
+                continue
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self.get(key)
+            if entry is None:
+                entry = await compute()
+                if entry.status_code < 400:
+                    await self.set(key, entry, ttl)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def cached(self, ttl=None, tags=()):
+        def decorator(func):
+            signature = inspect.signature(func)
+            inject_request = "request" not in signature.parameters
+            if inject_request:
+                parameters = [
+                    *signature.parameters.values(),
+                    inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+                ]
+                signature = signature.replace(parameters=parameters)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.pop("request") if inject_request else kwargs["request"]
+
+                async def compute():
+                    if asyncio.iscoroutinefunction(func):
+                        result = await func(*args, **kwargs)
+                    else:
+                        result = await run_in_threadpool(func, *args, **kwargs)
+                    return to_entry(result, tags)
+
+                entry = await self.get_or_compute(self.key_for(request), compute, ttl)
+                return entry_response(entry, request)
+
+            wrapper.__signature__ = signature
+            return wrapper
+
+        return decorator
+
+
+def to_entry(result, tags=()):
+    if isinstance(result, Response):
+        body = bytes(result.body)
+        media_type = result.media_type
+        status_code = result.status_code
+    else:
+        body = json.dumps(jsonable_encoder(result), separators=(",", ":")).encode()
+        media_type = "application/json"
+        status_code = 200
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    return CacheEntry(body, media_type, status_code, etag, tags)
+
+
+def entry_response(entry, request):
+    headers = {"ETag": entry.etag}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and entry.etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, status_code=entry.status_code, media_type=entry.media_type, headers=headers)
@@ -0,0 +1,253 @@
+"""Async SQLite data layer for lesson progress and lab submissions.
+
+SQLite allows many readers but only one writer, so the layer is split the
+same way:
+
+* reads go through a bounded pool of ``query_only`` connections, each used
+  by one task at a time on a worker thread;
+* writes are queued to a single writer connection, which drains the queue
+  into one transaction per batch. Progress updates for the same
+  ``(user_id, lesson_id)`` inside a batch are coalesced to the latest value.
+
+All connections run in WAL mode with the pragmas below, and rely on
+sqlite3's per-connection statement cache so repeated queries are prepared
+once.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_URL = "sqlite:///./app.db"
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+MAX_BATCH = 512
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lesson_progress (
+    user_id TEXT NOT NULL,
+    lesson_id TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, lesson_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS lab_submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    lab_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS lab_submissions_user ON lab_submissions (user_id, id);
+"""
+
+UPSERT_PROGRESS = """
+INSERT INTO lesson_progress (user_id, lesson_id, progress, updated_at)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, lesson_id) DO UPDATE SET
+    progress = excluded.progress,
+    updated_at = excluded.updated_at
+"""
+
+INSERT_SUBMISSION = """
+INSERT INTO lab_submissions (user_id, lab_id, payload, created_at)
+VALUES (?, ?, ?, ?)
+RETURNING id
+"""
+
+SELECT_PROGRESS = """
+SELECT lesson_id, progress, updated_at FROM lesson_progress
+WHERE user_id = ? AND lesson_id > ?
+ORDER BY lesson_id
+LIMIT ?
+"""
+
+SELECT_SUBMISSIONS = """
+SELECT id, lab_id, payload, created_at FROM lab_submissions
+WHERE user_id = ? AND id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+
+def path_from_url(url):
+    prefix = "sqlite:///"
+    if not url.startswith(prefix):
+        raise ValueError(f"Unsupported DATABASE_URL: {url}")
+    path = url[len(prefix):]
+    if path in ("", ":memory:"):
+        # The writer and every pooled reader open their own connection, and
+        # each would get a separate, empty in-memory database.
+        raise ValueError(f"In-memory databases are not supported: {url}")
+    return path
+
+
+def connect(path, readonly=False):
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class Page:
+    __slots__ = ("items", "next_cursor")
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+
+class Database:
+    def __init__(self, path, pool_size=POOL_SIZE, max_batch=MAX_BATCH):
+        self.path = path
+        self.pool_size = pool_size
+        self.max_batch = max_batch
+        self._readers = None
+        self._read_executor = None
+        self._write_executor = None
+        self._writer = None
+        self._queue = None
+        self._writer_task = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(path_from_url(os.environ.get("DATABASE_URL", DEFAULT_URL)), **kwargs)
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._read_executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="db-reader")
+
+        def open_writer():
+            conn = connect(self.path)
+            conn.executescript(SCHEMA)
+            return conn
+
+        self._writer = await loop.run_in_executor(self._write_executor, open_writer)
+        self._readers = asyncio.Queue()
+        for _ in range(self.pool_size):
+            conn = await loop.run_in_executor(self._read_executor, connect, self.path, True)
+            self._readers.put_nowait(conn)
+        self._queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def close(self):
+        if self._writer_task is None:
+            return
+        await self._queue.join()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+        self._writer_task = None
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        self._writer.close()
+        self._read_executor.shutdown()
+        self._write_executor.shutdown()
+
+    # Reads
+
+    async def _read(self, sql, params):
+        conn = await self._readers.get()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._read_executor.submit(lambda: conn.execute(sql, params).fetchall())
+        except BaseException:
+            self._readers.put_nowait(conn)
+            raise
+        # Return the connection only once the worker thread is done with it:
+        # if this task is cancelled, the query keeps running on it.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._readers.put_nowait, conn))
+        return await asyncio.wrap_future(future)
+
+    async def list_progress(self, user_id, after=None, limit=50):
+        rows = await self._read(SELECT_PROGRESS, (user_id, after or "", limit))
+        items = [dict(row) for row in rows]
+        next_cursor = items[-1]["lesson_id"] if len(items) == limit else None
+        return Page(items, next_cursor)
+
+    async def list_submissions(self, user_id, after=None, limit=50):
+        rows = await self._read(SELECT_SUBMISSIONS, (user_id, after or 0, limit))
+        items = [dict(row) for row in rows]
+        next_cursor = items[-1]["id"] if len(items) == limit else None
+        return Page(items, next_cursor)
+
+    # Writes
+
+    def _submit(self, kind, args):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((kind, args, future))
+        return future
+
+    async def record_progress(self, user_id, lesson_id, progress):
+        await self._submit("progress", (user_id, lesson_id, progress, time.time()))
+
+    async def add_submission(self, user_id, lab_id, payload):
+        return await self._submit("submission", (user_id, lab_id, payload, time.time()))
+
+    def _write_batch(self, batch):
+        # Runs on the writer thread. Later progress updates for the same
+        # lesson replace earlier ones, so they cost one row write.
+        progress = {}
+        results = []
+        for kind, args, _ in batch:
+            if kind == "progress":
+                progress[args[:2]] = args
+        conn = self._writer
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if progress:
+                conn.executemany(UPSERT_PROGRESS, progress.values())
+            for kind, args, _ in batch:
+                if kind == "submission":
+                    results.append(conn.execute(INSERT_SUBMISSION, args).fetchone()[0])
+                else:
+                    results.append(None)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(self._write_executor, self._write_batch, batch)
+            except Exception as exc:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for (_, _, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -1,8 +1,169 @@
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.auth import Authenticator
+from app.cache import ResponseCache
+from app.db import Database
+from app.metrics import LoopLagMonitor, Metrics, MetricsMiddleware, Profiler
+from app.ratelimit import RateLimitMiddleware, jwt_subject, settings_from_env
+from app.streams import SSEEncoder, StreamHub, lab_channel, sse_event
+
+cache = ResponseCache.from_env()
+db = Database.from_env()
+auth = Authenticator.from_env()
+metrics = Metrics()
+loop_lag = LoopLagMonitor(metrics)
+profiler = Profiler()
+streams = StreamHub.from_env()
+
+@asynccontextmanager
+async def lifespan(app):
+    await db.open()
+    await cache.start()
+    loop_lag.start()
+    yield
+    await loop_lag.stop()
+    profiler.stop()
+    await streams.close()
+    await db.close()
+    await cache.close()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    RateLimitMiddleware,
+    redis=cache.redis,
+    identify=jwt_subject(auth),
+    **settings_from_env(),
+    exempt=("/metrics",),
+)
+app.add_middleware(MetricsMiddleware, metrics=metrics, profiler=profiler)
+
+def current_user(user_id: str, claims: dict = Depends(auth)):
+    if claims.get("sub") != user_id:
+        raise HTTPException(403, "Not allowed to access another user's data")
+    return user_id
+
+def can_watch_lab(claims, user_id):
+    # Labs belong to the user in their path; staff may watch anyone's.
+    return claims.get("sub") == user_id or claims.get("admin") is True or claims.get("instructor") is True
+
+def lab_viewer(user_id: str, claims: dict = Depends(auth)):
+    if not can_watch_lab(claims, user_id):
+        raise HTTPException(403, "Not allowed to watch another user's lab")
+    return claims
+
+def require_admin(claims: dict = Depends(auth)):
+    if claims.get("admin") is not True:
+        raise HTTPException(403, "Admin only")
+    return claims
+
+class ProgressUpdate(BaseModel):
+    progress: int = Field(ge=0, le=100)
+
+class Submission(BaseModel):
+    payload: str
 
 @app.get("/")
+@cache.cached(ttl=60, tags=["root"])
 async def root():
     return {"message": "Hello World"}
+
+@app.put("/users/{user_id}/progress/{lesson_id}", status_code=204, dependencies=[Depends(current_user)])
+async def record_progress(user_id: str, lesson_id: str, update: ProgressUpdate):
+    await db.record_progress(user_id, lesson_id, update.progress)
+
+@app.get("/users/{user_id}/progress", dependencies=[Depends(current_user)])
+async def list_progress(user_id: str, after: str | None = None, limit: int = Query(50, ge=1, le=500)):
+    page = await db.list_progress(user_id, after, limit)
+    return {"items": page.items, "next": page.next_cursor}
+
+@app.post("/users/{user_id}/labs/{lab_id}/submissions", status_code=201, dependencies=[Depends(current_user)])
+async def add_submission(user_id: str, lab_id: str, submission: Submission):
+    return {"id": await db.add_submission(user_id, lab_id, submission.payload)}
+
+@app.get("/users/{user_id}/submissions", dependencies=[Depends(current_user)])
+async def list_submissions(user_id: str, after: int | None = None, limit: int = Query(50, ge=1, le=500)):
+    page = await db.list_submissions(user_id, after, limit)
+    return {"items": page.items, "next": page.next_cursor}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/profile", status_code=202, dependencies=[Depends(require_admin)])
+async def start_profile(duration: float = Query(10, gt=0, le=300), fraction: float | None = Query(None, gt=0, le=1)):
+    try:
+        profiler.start(duration, fraction)
+    except RuntimeError as exc:
+        raise HTTPException(409, str(exc)) from None
+    return {"duration": duration, "fraction": fraction}
+
+@app.get("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def last_profile():
+    if profiler.running:
+        raise HTTPException(409, "Profiler still running")
+    if profiler.last_output is None:
+        raise HTTPException(404, "No profile recorded yet")
+    with open(profiler.last_output) as f:
+        return PlainTextResponse(f.read())
+
+@app.post("/users/{user_id}/labs/{lab_id}/output", status_code=204, dependencies=[Depends(require_admin)])
+async def publish_output(user_id: str, lab_id: str, data: bytes = Body(..., media_type="application/octet-stream")):
+    await streams.publish(lab_channel(user_id, lab_id), data)
+
+@app.get("/users/{user_id}/labs/{lab_id}/stream", dependencies=[Depends(lab_viewer)])
+async def stream_output(user_id: str, lab_id: str, policy: str = Query("coalesce", pattern="^(drop|coalesce)$")):
+    channel = lab_channel(user_id, lab_id)
+    subscriber = streams.subscribe(channel, policy=policy)
+
+    async def events():
+        encoder = SSEEncoder()
+        reported = 0
+        try:
+            while (chunks := await subscriber.get()) is not None:
+                if subscriber.dropped != reported:
+                    yield sse_event(str(subscriber.dropped - reported), event="dropped")
+                    reported = subscriber.dropped
+                if event := encoder.encode(b"".join(chunks)):
+                    yield event
+        finally:
+            await streams.unsubscribe(channel, subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/users/{user_id}/labs/{lab_id}/ws")
+async def websocket_output(websocket: WebSocket, user_id: str, lab_id: str, token: str, policy: str = "coalesce"):
+    try:
+        claims = auth.verify(token)
+    except Exception:
+        # Whatever the reason, an unverifiable token must refuse the
+        # handshake rather than surface as a server error.
+        claims = None
+    if claims is None or not can_watch_lab(claims, user_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    channel = lab_channel(user_id, lab_id)
+    subscriber = streams.subscribe(channel, policy="drop" if policy == "drop" else "coalesce")
+
+    async def watch_disconnect():
+        # Viewers only read; this just notices when they go away.
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        subscriber.close()
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        while (chunks := await subscriber.get()) is not None:
+            await websocket.send_bytes(b"".join(chunks))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        await streams.unsubscribe(channel, subscriber)
@@ -0,0 +1,257 @@
+"""Latency instrumentation, Prometheus exposition and on-demand profiling.
+
+``MetricsMiddleware`` records, per route template and status class, a
+latency histogram and response-size counter, plus an in-flight gauge per
+route. The route is only known once the router has matched it, so rather
+than matching up front the middleware keeps the in-flight scopes and
+``render`` groups them by their matched route at scrape time. Everything is
+updated from the event loop thread with plain integer, list and dict
+operations, so recording takes no locks. ``LoopLagMonitor``
+measures how late the event loop wakes a sleeping task.
+
+``Profiler`` is a stack-sampling profiler driven from a background thread.
+It samples the event loop thread either for a fixed window or only while a
+sampled fraction of requests is in flight, and emits collapsed stacks
+(``frame;frame;frame count``) that flamegraph.pl and speedscope read
+directly.
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+UNMATCHED = "<unmatched>"
+
+
+def route_label(scope):
+    # FastAPI stores the matched route in the scope; fall back to a fixed
+    # label so unknown paths cannot blow up cardinality.
+    return getattr(scope.get("route"), "path", UNMATCHED)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels=""):
+        sep = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RouteStats:
+    __slots__ = ("latency", "response_bytes")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_bytes = 0
+
+
+class Metrics:
+    def __init__(self):
+        self.routes = {}
+        # id(scope) -> scope for every request being handled.
+        self.active = {}
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.loop_lag_last = 0.0
+
+    def observe(self, method, route, status, seconds, size):
+        key = (method, route, STATUS_CLASSES[status // 100 - 1] if 100 <= status < 600 else "5xx")
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        stats.latency.observe(seconds)
+        stats.response_bytes += size
+
+    def render(self):
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        routes = sorted(self.routes.items())
+        for (method, route, status), stats in routes:
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            lines += stats.latency.render("http_request_duration_seconds", labels)
+        lines += [
+            "# HELP http_response_size_bytes_total Response body bytes sent by route.",
+            "# TYPE http_response_size_bytes_total counter",
+        ]
+        for (method, route, status), stats in routes:
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            lines.append(f"http_response_size_bytes_total{{{labels}}} {stats.response_bytes}")
+        # Routes seen before report 0 rather than vanishing when idle.
+        in_flight = dict.fromkeys({(method, route) for method, route, _ in self.routes}, 0)
+        for scope in list(self.active.values()):
+            key = (scope["method"], route_label(scope))
+            in_flight[key] = in_flight.get(key, 0) + 1
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled by route.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for (method, route), count in sorted(in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{method}",route="{route}"}} {count}')
+        lines += [
+            "# HELP event_loop_lag_seconds How late the event loop woke a sleeping task.",
+            "# TYPE event_loop_lag_seconds histogram",
+            *self.loop_lag.render("event_loop_lag_seconds"),
+            "# TYPE event_loop_lag_last_seconds gauge",
+            f"event_loop_lag_last_seconds {self.loop_lag_last}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics, profiler=None):
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        sampled = self.profiler is not None and self.profiler.enter_request()
+        key = id(scope)
+        metrics.active[key] = scope
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            del metrics.active[key]
+            if sampled:
+                self.profiler.exit_request()
+            metrics.observe(scope["method"], route_label(scope), status, elapsed, size)
+
+
+class LoopLagMonitor:
+    def __init__(self, metrics, interval=0.5):
+        self.metrics = metrics
+        self.interval = interval
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.metrics.loop_lag_last = lag
+            self.metrics.loop_lag.observe(lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class Profiler:
+    def __init__(self, output_dir=None, interval=0.005):
+        self.output_dir = output_dir or os.environ.get("PROFILE_DIR", "profiles")
+        self.interval = interval
+        self.fraction = 0.0
+        self.last_output = None
+        self._target = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._sampled_requests = 0
+        self._all_requests = False
+        self._stacks = Counter()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def enter_request(self):
+        if not self.fraction or random.random() >= self.fraction:
+            return False
+        self._sampled_requests += 1
+        return True
+
+    def exit_request(self):
+        self._sampled_requests -= 1
+
+    def start(self, duration, fraction=None):
+        """Sample for ``duration`` seconds; if ``fraction`` is given, only
+        while one of that share of requests is in flight."""
+        if self.running:
+            raise RuntimeError("Profiler already running")
+        self._target = threading.get_ident()
+        self._stacks = Counter()
+        self._all_requests = fraction is None
+        self.fraction = fraction or 0.0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(duration,), name="profiler", daemon=True)
+        self._thread.start()
+
+    def _sample(self, duration):
+        deadline = time.monotonic() + duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            if self._all_requests or self._sampled_requests:
+                frame = sys._current_frames().get(self._target)
+                if frame is not None:
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    self._stacks[";".join(reversed(stack))] += 1
+            self._stop.wait(self.interval)
+        self.fraction = 0.0
+        self._dump()
+
+    def _dump(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{int(time.time())}.collapsed")
+        with open(path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last_output = path
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,257 @@
+"""Per-IP and per-user token-bucket rate limiting.
+
+Implemented as plain ASGI middleware so abusive clients are rejected before
+routing, validation or the handler run. All buckets that apply to a request
+are checked and charged atomically by one Lua script, preloaded with
+``SCRIPT LOAD`` and invoked by sha, so a check is a single Redis round trip
+however many limits apply.
+
+If Redis is unreachable the middleware falls back to an in-process limiter
+(per worker, so effectively ``workers x limit``) and retries Redis after
+``retry_after`` seconds rather than paying a connection timeout per request.
+
+WebSocket handshakes are limited the same way and refused before the
+socket is accepted. Behind reverse proxies, set ``trusted_proxies`` to the
+number of proxy hops so the client address is taken from
+``X-Forwarded-For`` rather than sharing one bucket for the proxy.
+"""
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from redis.exceptions import NoScriptError
+
+from app.auth import Authenticator
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rl:"
+
+# KEYS: bucket keys. ARGV: now_ms, then rate (tokens/s) and burst per key.
+# Returns {allowed, retry_after_ms}. A request is charged against every
+# bucket only if all of them have a token left.
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local allowed = 1
+local retry = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 't', 'ts')
+    local t = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    t = math.min(burst, t + math.max(0, now - ts) * rate / 1000)
+    if t < 1 then
+        allowed = 0
+        retry = math.max(retry, math.ceil((1 - t) * 1000 / rate))
+    end
+    tokens[i] = t
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local t = tokens[i]
+    if allowed == 1 then
+        t = t - 1
+    end
+    redis.call('HSET', key, 't', tostring(t), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst * 1000 / rate) + 1000)
+end
+return {allowed, retry}
+"""
+
+
+class Limit:
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        burst = rate if burst is None else burst
+        if burst < 1:
+            raise ValueError(f"Burst must be at least 1, got {burst}")
+        self.rate = rate
+        self.burst = burst
+
+    @classmethod
+    def parse(cls, value):
+        """Parse ``"rate"`` or ``"rate/burst"``, e.g. ``"10/20"``."""
+        rate, _, burst = value.partition("/")
+        return cls(float(rate), float(burst) if burst else None)
+
+
+class LocalLimiter:
+    """Token buckets in an LRU-ordered dict.
+
+    Only used from the event loop thread, and every check runs to
+    completion without awaiting, so no locking is needed. Past
+    ``max_buckets`` the least recently used buckets are evicted, so a
+    client cycling through addresses or subjects only pushes out idle
+    buckets, never the busy ones it is competing with.
+    """
+
+    def __init__(self, max_buckets=100_000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    def check(self, buckets, now_ms):
+        allowed = True
+        retry = 0
+        state = []
+        for key, limit in buckets:
+            tokens, ts = self._buckets.get(key, (limit.burst, now_ms))
+            tokens = min(limit.burst, tokens + max(0, now_ms - ts) * limit.rate / 1000)
+            if tokens < 1:
+                allowed = False
+                retry = max(retry, math.ceil((1 - tokens) * 1000 / limit.rate))
+            state.append((key, tokens))
+        for key, tokens in state:
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now_ms)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return allowed, retry
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, redis=None, ip_limit=None, user_limit=None, identify=None,
+                 exempt=(), trusted_proxies=0, limit_websockets=True, retry_after=1.0,
+                 clock=time.time):
+        self.app = app
+        self.redis = redis
+        self.ip_limit = ip_limit
+        self.user_limit = user_limit
+        self.identify = identify
+        self.exempt = tuple(exempt)
+        self.trusted_proxies = trusted_proxies
+        self.scope_types = ("http", "websocket") if limit_websockets else ("http",)
+        self.retry_after = retry_after
+        self.clock = clock
+        self.local = LocalLimiter()
+        self._sha = None
+        self._redis_down_until = 0.0
+
+    def client_ip(self, scope, headers):
+        if self.trusted_proxies:
+            forwarded = headers.get(b"x-forwarded-for")
+            if forwarded:
+                # Each trusted proxy appends the address it saw, so the
+                # client is the entry that many hops from the right; anything
+                # further left is client-supplied and could be spoofed.
+                hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",")]
+                return hops[max(0, len(hops) - self.trusted_proxies)]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def bearer_token(self, scope, headers):
+        authorization = headers.get(b"authorization")
+        if authorization:
+            scheme, _, token = authorization.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+        if scope["type"] == "websocket":
+            # Browsers cannot set headers on WebSocket handshakes, so the
+            # token travels in the query string.
+            tokens = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token")
+            return tokens[0] if tokens else None
+        return None
+
+    def user_id(self, scope, headers):
+        if self.identify is None:
+            return None
+        token = self.bearer_token(scope, headers)
+        if not token:
+            return None
+        try:
+            return self.identify(token)
+        except Exception:
+            # Invalid tokens are rejected by the auth dependency; here they
+            # are only subject to the per-IP limit.
+            return None
+
+    def buckets(self, scope):
+        headers = dict(scope["headers"])
+        buckets = []
+        if self.ip_limit is not None:
+            buckets.append((f"{KEY_PREFIX}ip:{self.client_ip(scope, headers)}", self.ip_limit))
+        if self.user_limit is not None:
+            user = self.user_id(scope, headers)
+            if user is not None:
+                buckets.append((f"{KEY_PREFIX}user:{user}", self.user_limit))
+        return buckets
+
+    async def check(self, buckets):
+        now_ms = int(self.clock() * 1000)
+        if self.redis is not None and time.monotonic() >= self._redis_down_until:
+            args = [now_ms]
+            for _, limit in buckets:
+                args += [limit.rate, limit.burst]
+            keys = [key for key, _ in buckets]
+            try:
+                if self._sha is None:
+                    self._sha = await self.redis.script_load(TOKEN_BUCKET_LUA)
+                try:
+                    allowed, retry = await self.redis.evalsha(self._sha, len(keys), *keys, *args)
+                except NoScriptError:
+                    # Script cache was flushed (e.g. Redis restarted).
+                    self._sha = await self.redis.script_load(TOKEN_BUCKET_LUA)
+                    allowed, retry = await self.redis.evalsha(self._sha, len(keys), *keys, *args)
+                return bool(allowed), int(retry)
+            except Exception:
+                logger.warning("Redis rate limiter unavailable, using local limits", exc_info=True)
+                self._redis_down_until = time.monotonic() + self.retry_after
+        return self.local.check(buckets, now_ms)
+
+    async def reject(self, scope, send, retry_ms):
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(max(1, math.ceil(retry_ms / 1000))).encode()),
+        ]
+        body = b'{"detail":"Too Many Requests"}'
+        if scope["type"] == "http":
+            await send({"type": "http.response.start", "status": 429, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+        elif "websocket.http.response" in scope.get("extensions", {}):
+            await send({"type": "websocket.http.response.start", "status": 429, "headers": headers})
+            await send({"type": "websocket.http.response.body", "body": body})
+        else:
+            # Closing before accept makes the server refuse the handshake.
+            await send({"type": "websocket.close", "code": 1008, "reason": "Too Many Requests"})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in self.scope_types or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+        buckets = self.buckets(scope)
+        if buckets:
+            allowed, retry_ms = await self.check(buckets)
+            if not allowed:
+                await self.reject(scope, send, retry_ms)
+                return
+        await self.app(scope, receive, send)
+
+
+def jwt_subject(authenticator: Authenticator):
+    """``identify`` callback that reuses the auth layer's verified-token cache."""
+    return lambda token: authenticator.verify(token).get("sub")
+
+
+def settings_from_env():
+    """Middleware keyword arguments from the environment.
+
+    ``RATE_LIMIT_IP`` / ``RATE_LIMIT_USER`` take ``rate/burst`` (empty
+    disables that limit), ``RATE_LIMIT_TRUSTED_PROXIES`` is the number of
+    reverse-proxy hops in front of the app and ``RATE_LIMIT_WEBSOCKETS=0``
+    stops limiting WebSocket handshakes.
+    """
+    ip = os.environ.get("RATE_LIMIT_IP", "20/40")
+    user = os.environ.get("RATE_LIMIT_USER", "10/20")
+    return {
+        "ip_limit": Limit.parse(ip) if ip else None,
+        "user_limit": Limit.parse(user) if user else None,
+        "trusted_proxies": int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "0")),
+        "limit_websockets": os.environ.get("RATE_LIMIT_WEBSOCKETS", "1") not in ("0", "false", "no"),
+    }
@@ -0,0 +1,216 @@
+"""Fan-out of live lab terminal output to WebSocket and SSE subscribers.
+
+Lab output is published once, with ``XADD`` to a capped Redis stream per
+lab, which also serves as the replay log. Each worker runs at most one
+reader task per channel, blocking on ``XREAD`` and handing every chunk to
+all local subscribers, so a channel costs one Redis connection per worker
+regardless of how many clients watch it. The reader starts with the first
+subscriber and stops when the last one leaves.
+
+Every subscriber has its own bounded buffer, so a slow client never holds
+up the reader or the other viewers. When the buffer is full, the ``drop``
+policy discards the oldest chunk and the ``coalesce`` policy appends to the
+newest one (terminal output concatenates cleanly); either way the buffer is
+also capped in bytes, trimming the oldest output first, and ``dropped``
+counts what was lost.
+
+Without Redis, ``publish`` delivers to local subscribers directly.
+
+Chunks are arbitrary slices of terminal output, so a UTF-8 sequence or a
+CRLF pair can straddle two of them; ``SSEEncoder`` keeps the partial piece
+per subscriber until the rest arrives.
+"""
+import asyncio
+import codecs
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "lab-output:"
+STREAM_MAXLEN = 10_000
+MAX_ITEMS = 256
+MAX_BYTES = 256 * 1024
+
+
+def lab_channel(user_id, lab_id):
+    """Channel name for one user's lab terminal."""
+    return f"{user_id}/{lab_id}"
+
+
+class Subscriber:
+    __slots__ = ("policy", "max_items", "max_bytes", "dropped", "closed", "_items", "_bytes", "_ready")
+
+    def __init__(self, policy="coalesce", max_items=MAX_ITEMS, max_bytes=MAX_BYTES):
+        if policy not in ("drop", "coalesce"):
+            raise ValueError(f"Unknown policy: {policy}")
+        self.policy = policy
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self.closed = False
+        self._items = deque()
+        self._bytes = 0
+        self._ready = asyncio.Event()
+
+    def put(self, data):
+        """Queue a chunk. Never blocks; applies the overflow policy instead."""
+        if len(self._items) >= self.max_items:
+            if self.policy == "coalesce":
+                self._items[-1] += data
+            else:
+                self._bytes -= len(self._items.popleft())
+                self._items.append(data)
+                self.dropped += 1
+        else:
+            self._items.append(data)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            self._bytes -= len(self._items.popleft())
+            self.dropped += 1
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Wait for and return every buffered chunk, or ``None`` once closed."""
+        while not self._items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        items = list(self._items)
+        self._items.clear()
+        self._bytes = 0
+        return items
+
+
+class StreamHub:
+    def __init__(self, redis=None, block_ms=5000, batch=256, maxlen=STREAM_MAXLEN):
+        self.redis = redis
+        self.block_ms = block_ms
+        self.batch = batch
+        self.maxlen = maxlen
+        self._subscribers = {}
+        self._readers = {}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        url = os.environ.get("REDIS_URL")
+        client = None
+        if url:
+            import redis.asyncio
+
+            # Readers hold a connection while blocked in XREAD, so they get
+            # their own client rather than starving the shared pool.
+            client = redis.asyncio.from_url(url)
+        return cls(redis=client, **kwargs)
+
+    async def close(self):
+        for channel in list(self._subscribers):
+            for subscriber in self._subscribers.pop(channel):
+                subscriber.close()
+            await self._stop_reader(channel)
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def subscriber_count(self, channel=None):
+        if channel is not None:
+            return len(self._subscribers.get(channel, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def publish(self, channel, data):
+        if self.redis is None:
+            self._fan_out(channel, data)
+            return
+        await self.redis.xadd(STREAM_PREFIX + channel, {"d": data}, maxlen=self.maxlen, approximate=True)
+
+    def subscribe(self, channel, **kwargs):
+        subscriber = Subscriber(**kwargs)
+        self._subscribers.setdefault(channel, set()).add(subscriber)
+        if self.redis is not None and channel not in self._readers:
+            self._readers[channel] = asyncio.create_task(self._read(channel))
+        return subscriber
+
+    async def unsubscribe(self, channel, subscriber):
+        subscriber.close()
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[channel]
+            await self._stop_reader(channel)
+
+    async def _stop_reader(self, channel):
+        task = self._readers.pop(channel, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _fan_out(self, channel, data):
+        for subscriber in self._subscribers.get(channel, ()):
+            subscriber.put(data)
+
+    async def _read(self, channel):
+        key = STREAM_PREFIX + channel
+        last_id = "$"
+        delay = 0.1
+        while True:
+            try:
+                response = await self.redis.xread({key: last_id}, count=self.batch, block=self.block_ms)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Reading %s failed, retrying in %.1fs", key, delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+            delay = 0.1
+            for _, entries in response or ():
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    self._fan_out(channel, fields[b"d"])
+
+
+def sse_event(data, event=None):
+    """Encode one Server-Sent Event; multi-line payloads become several ``data:`` lines.
+
+    SSE treats CR, LF and CRLF alike as line ends, so all three are
+    normalised to LF first; a bare CR left inside a ``data:`` line would end
+    it early on the client.
+    """
+    text = data.decode("utf-8", "replace") if isinstance(data, bytes) else data
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in text.split("\n")]
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class SSEEncoder:
+    """Turns one subscriber's byte chunks into SSE events.
+
+    A multibyte character or a CRLF split across chunks is held back until
+    the next chunk completes it, so it is neither replaced with U+FFFD nor
+    doubled into two line breaks.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._pending_cr = False
+
+    def encode(self, data):
+        """Return the event for ``data``, or ``b""`` if all of it is held back."""
+        text = self._decoder.decode(data)
+        if self._pending_cr:
+            text = "\r" + text
+        self._pending_cr = text.endswith("\r")
+        if self._pending_cr:
+            text = text[:-1]
+        return sse_event(text) if text else b""
@@ -0,0 +1,52 @@
+"""Cached vs uncached JWT verification.
+
+    python -m bench.auth_bench [--requests 50000] [--concurrency 200] [--users 500]
+
+Run from ``backend/``; needs PyJWT. Each simulated request verifies the
+bearer token of one of ``--users`` active users, the way the auth
+dependency does on every authenticated route.
+"""
+import argparse
+import asyncio
+import time
+
+import jwt
+
+from app.auth import Authenticator, prepare_keys
+
+SECRET = "bench-secret-bench-secret-bench-secret"
+
+
+async def run(name, verify, tokens, requests, concurrency):
+    async def worker(offset):
+        for i in range(offset, requests, concurrency):
+            verify(tokens[i % len(tokens)])
+            if i % 16 == 0:
+                await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10} {requests / elapsed:>10.0f} verifications/s  {elapsed / requests * 1e6:6.2f} us each")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    exp = int(time.time()) + 3600
+    tokens = [jwt.encode({"sub": f"user-{n}", "exp": exp}, SECRET) for n in range(args.users)]
+    keys = prepare_keys({"default": {"alg": "HS256", "secret": SECRET}})
+
+    def uncached(token):
+        return jwt.decode(token, SECRET, algorithms=["HS256"], options={"require": ["exp"]})
+
+    await run("uncached", uncached, tokens, args.requests, args.concurrency)
+    await run("cached", Authenticator(keys=keys).verify, tokens, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Hit-path latency and throughput of the response cache.
+
+    python -m bench.cache_bench [--requests 20000] [--concurrency 100]
+
+Run from ``backend/``. Every key is populated before timing, and the local
+and Redis tiers are measured separately. Uses fakeredis for the Redis tier
+when it is installed, otherwise measures the local tier only.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.cache import CacheEntry, ResponseCache
+from bench.common import make_redis, percentile
+
+
+ENTRY = CacheEntry(b'{"message":"Hello World"}', "application/json", 200, '"etag"')
+
+
+async def measure(name, lookup, keys, requests, concurrency):
+    """Time ``lookup(key)`` on keys that are all expected to be present."""
+    latencies = []
+    misses = 0
+
+    async def worker(offset, n):
+        nonlocal misses
+        for i in range(offset, offset + n):
+            key = keys[i % len(keys)]
+            start = time.perf_counter_ns()
+            entry = await lookup(key)
+            latencies.append(time.perf_counter_ns() - start)
+            if entry is None:
+                misses += 1
+
+    per_worker = requests // concurrency
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n * 7, per_worker) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<18} {len(latencies) / elapsed:>10.0f} req/s  "
+          f"p50 {percentile(latencies, 50) / 1000:6.1f} us  "
+          f"p99 {percentile(latencies, 99) / 1000:6.1f} us  "
+          f"mean {statistics.fmean(latencies) / 1000:6.1f} us  misses {misses}")
+
+
+async def local_hits(keys, requests, concurrency):
+    cache = ResponseCache()
+    for key in keys:
+        await cache.set(key, ENTRY)
+
+    async def compute():
+        raise AssertionError("local hit path should never compute")
+
+    await measure("local hit", lambda key: cache.get_or_compute(key, compute), keys, requests, concurrency)
+
+
+async def redis_hits(redis, keys, requests, concurrency):
+    writer = ResponseCache(redis=redis)
+    for key in keys:
+        await writer.set(key, ENTRY)
+    # A zero-sized local tier forces every lookup through to Redis.
+    reader = ResponseCache(redis=redis, max_entries=0)
+    await measure("redis hit", reader.get, keys, requests, concurrency)
+
+
+async def single_flight(concurrency):
+    cache = ResponseCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return CacheEntry(b"{}", "application/json", 200, '"x"')
+
+    await asyncio.gather(*(cache.get_or_compute("cache:cold", compute) for _ in range(concurrency)))
+    print(f"{'single-flight':<18} {concurrency} concurrent misses -> {calls} computation(s)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--keys", type=int, default=256)
+    args = parser.parse_args()
+
+    keys = [f"cache:key-{i}" for i in range(args.keys)]
+    await local_hits(keys, args.requests, args.concurrency)
+
+    redis = make_redis()
+    if redis is not None:
+        await redis_hits(redis, keys, args.requests, args.concurrency)
+    else:
+        print("redis hit          skipped (fakeredis not installed)")
+
+    await single_flight(args.concurrency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,15 @@
+"""Helpers shared by the benchmarks."""
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def make_redis():
+    """A fakeredis client as the Redis stand-in, or ``None`` if not installed."""
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError:
+        return None
+    return FakeAsyncRedis()
@@ -0,0 +1,92 @@
+"""Concurrent reads and writes through the ASGI app against a temp database.
+
+    python -m bench.db_bench [--requests 5000] [--concurrency 64] [--write-ratio 0.5]
+
+Run from ``backend/``; needs httpx and PyJWT.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from bench.common import percentile
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.5)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        await run(args, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+async def run(args, tmp):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.pop("REDIS_URL", None)
+    os.environ.pop("JWT_KEYS_FILE", None)
+    os.environ["RATE_LIMIT_IP"] = ""
+    os.environ["RATE_LIMIT_USER"] = ""
+    os.environ["JWT_SECRET"] = "bench-secret-bench-secret-bench-secret"
+
+    import httpx
+    import jwt
+
+    from app.main import app, db
+
+    await db.open()
+    exp = int(time.time()) + 3600
+    headers = {
+        f"user-{n}": {"Authorization": "Bearer " + jwt.encode({"sub": f"user-{n}", "exp": exp}, os.environ["JWT_SECRET"])}
+        for n in range(args.users)
+    }
+    latencies = {"read": [], "write": []}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(i):
+            user = f"user-{i % args.users}"
+            if random.random() < args.write_ratio:
+                kind = "write"
+                if i % 2:
+                    request = client.put(f"/users/{user}/progress/lesson-{i % 40}", json={"progress": i % 101}, headers=headers[user])
+                else:
+                    request = client.post(f"/users/{user}/labs/lab-{i % 10}/submissions", json={"payload": "flag{x}"}, headers=headers[user])
+            else:
+                kind = "read"
+                path = "progress" if i % 2 else "submissions"
+                request = client.get(f"/users/{user}/{path}", params={"limit": 20}, headers=headers[user])
+            start = time.perf_counter()
+            response = await request
+            latencies[kind].append(time.perf_counter() - start)
+            response.raise_for_status()
+
+        async def worker(offset):
+            for i in range(offset, args.requests, args.concurrency):
+                await one(i)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    await db.close()
+
+    print(f"{args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    for kind, samples in latencies.items():
+        if not samples:
+            continue
+        print(f"{kind:<6} n={len(samples):<6} p50 {percentile(samples, 50) * 1000:7.2f} ms  "
+              f"p99 {percentile(samples, 99) * 1000:7.2f} ms")
+    print(f"writes/s {len(latencies['write']) / elapsed:.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Recording cost of the metrics middleware.
+
+    python -m bench.metrics_bench [--requests 200000]
+
+Run from ``backend/``. Compares a no-op ASGI app with and without
+``MetricsMiddleware`` and times ``Metrics.observe`` on its own.
+"""
+import argparse
+import asyncio
+import time
+
+from app.metrics import Metrics, MetricsMiddleware, Profiler
+
+
+class Route:
+    path = "/users/{user_id}/progress"
+
+
+async def noop_app(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def send(message):
+    pass
+
+
+async def run(app, requests):
+    scope = {"type": "http", "method": "GET", "path": "/users/1/progress", "headers": []}
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), None, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    started = time.perf_counter()
+    for i in range(args.requests):
+        metrics.observe("GET", "/users/{user_id}/progress", 200, (i % 100) / 1000, 128)
+    observe = (time.perf_counter() - started) / args.requests * 1e6
+
+    base = await run(noop_app, args.requests)
+    instrumented = await run(MetricsMiddleware(noop_app, Metrics(), Profiler()), args.requests)
+    print(f"Metrics.observe      {observe:6.2f} us")
+    print(f"no middleware        {base:6.2f} us/request")
+    print(f"with middleware      {instrumented:6.2f} us/request  (+{instrumented - base:.2f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""Per-request overhead of the rate limiting middleware.
+
+    python -m bench.ratelimit_bench [--requests 50000] [--clients 1000]
+
+Run from ``backend/``. Drives the middleware directly with ASGI scopes
+around a no-op app, so the numbers are the limiter's cost alone. The Redis
+scenario uses fakeredis (with Lua support) when it is installed.
+"""
+import argparse
+import asyncio
+import time
+
+from app.ratelimit import Limit, RateLimitMiddleware
+from bench.common import make_redis
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def send(message):
+    pass
+
+
+async def run(name, app, requests, clients):
+    scopes = [
+        {
+            "type": "http",
+            "path": "/",
+            "headers": [(b"authorization", f"Bearer user-{n}".encode())],
+            "client": (f"10.0.{n // 256}.{n % 256}", 40000),
+        }
+        for n in range(clients)
+    ]
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % clients], None, send)
+    elapsed = time.perf_counter() - started
+    return name, elapsed / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=1000)
+    args = parser.parse_args()
+
+    limits = dict(ip_limit=Limit(1e9), user_limit=Limit(1e9), identify=lambda token: token)
+    results = [
+        await run("no limiter", noop_app, args.requests, args.clients),
+        await run("local", RateLimitMiddleware(noop_app, **limits), args.requests, args.clients),
+    ]
+    redis = make_redis()
+    if redis is not None:
+        results.append(await run("redis (fake)", RateLimitMiddleware(noop_app, redis=redis, **limits),
+                                 args.requests // 10, args.clients))
+
+    base = results[0][1]
+    for name, per_request in results:
+        print(f"{name:<14} {per_request:8.2f} us/request  (+{per_request - base:.2f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Fan-out latency and memory with many concurrent lab-output subscribers.
+
+    python -m bench.stream_bench [--subscribers 2000] [--messages 500] [--slow 0.1]
+
+Run from ``backend/``. Attaches ``--subscribers`` consumers to one channel
+through ``StreamHub``, a ``--slow`` fraction of which read only every 50 ms,
+publishes timestamped chunks and reports delivery latency and memory. Uses
+fakeredis as the Redis stand-in when installed, otherwise the hub's local
+fan-out.
+"""
+import argparse
+import asyncio
+import time
+import resource
+
+from app.streams import StreamHub
+from bench.common import make_redis, percentile
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--size", type=int, default=200, help="Bytes per chunk.")
+    parser.add_argument("--slow", type=float, default=0.1, help="Fraction of slow subscribers.")
+    parser.add_argument("--policy", choices=("drop", "coalesce"), default="coalesce")
+    args = parser.parse_args()
+
+    redis = make_redis()
+    hub = StreamHub(redis=redis, block_ms=100)
+    channel = "bench"
+    latencies = []
+    received = 0
+    slow_every = int(1 / args.slow) if args.slow else 0
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    subscribers = [hub.subscribe(channel, policy=args.policy) for _ in range(args.subscribers)]
+
+    async def consume(n, subscriber):
+        nonlocal received
+        slow = slow_every and n % slow_every == 0
+        # Only a sample of subscribers record latencies, so the measurement
+        # itself does not dominate memory.
+        sampled = n % 10 == 0
+        while (chunks := await subscriber.get()) is not None:
+            now = time.perf_counter()
+            received += len(chunks)
+            if sampled:
+                # Coalesced chunks are timed by their first message.
+                latencies.extend(now - float(chunk[:20]) for chunk in chunks)
+            if slow:
+                await asyncio.sleep(0.05)
+
+    consumers = [asyncio.create_task(consume(n, s)) for n, s in enumerate(subscribers)]
+    await asyncio.sleep(0.2)
+    padding = b"x" * max(0, args.size - 21)
+
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        await hub.publish(channel, f"{time.perf_counter():<20.6f}".encode()[:20] + b" " + padding)
+        await asyncio.sleep(0)
+    publish_elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    # ru_maxrss is in KiB on Linux.
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+
+    for subscriber in subscribers:
+        await hub.unsubscribe(channel, subscriber)
+    await asyncio.gather(*consumers)
+    await hub.close()
+
+    dropped = sum(s.dropped for s in subscribers)
+    print(f"backend        {'fakeredis' if redis is not None else 'local'}")
+    print(f"subscribers    {args.subscribers} ({args.slow:.0%} slow, policy={args.policy})")
+    print(f"published      {args.messages} in {publish_elapsed:.2f}s")
+    print(f"delivered      {received} chunks, {dropped} dropped")
+    print(f"latency        p50 {percentile(latencies, 50) * 1000:.2f} ms  p99 {percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"memory         peak RSS growth {peak / 2**20:.1f} MiB ({peak / args.subscribers / 1024:.1f} KiB/subscriber)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
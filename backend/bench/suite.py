@@ -0,0 +1,280 @@
+"""Backend load-test suite with regression gates (``make bench``).
+
+    python -m bench.suite [--scenario NAME ...] [--concurrency 32] [--requests 3000]
+                          [--mix read=70,progress=20,submit=10] [--uvicorn]
+                          [--runs 3] [--tolerance 0.25] [--update-baseline]
+
+Run from ``backend/`` after ``pip install -r bench/requirements.txt``.
+Each scenario drives the app with a closed-loop asyncio load generator:
+``--concurrency`` workers issue requests drawn from the scenario's weighted
+mix until ``--requests`` have completed. Each scenario is measured
+``--runs`` times and the median of every metric is reported, so one noisy
+run cannot trip the gate. By default the app runs in-process through
+httpx's ASGI transport with its lifespan started; ``--uvicorn`` spawns a
+local uvicorn instead to include the HTTP server. Nothing touches the
+network beyond localhost.
+
+Results are compared with ``bench/baseline.json``. A scenario fails when its
+throughput drops, or its p99 latency rises, by more than ``--tolerance``
+relative to the baseline (p99 also gets ``P99_SLACK_MS`` of absolute
+slack), and also when it has no baseline at all; only an ad-hoc ``--mix``
+run is exempt. ``--update-baseline`` records the current run and the
+machine it ran on, separately per transport: ``make bench-baseline`` for
+the in-process app, ``make bench-baseline-uvicorn`` for ``--uvicorn``.
+Numbers only compare meaningfully on that same reference box, so re-record
+there when the hardware changes or a deliberate performance change moves
+them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.common import percentile
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+USERS = 50
+SECRET = "bench-secret-bench-secret-bench-secret"
+# Absolute p99 allowance on top of --tolerance: sub-millisecond tails move
+# by more than 25% on scheduler jitter alone.
+P99_SLACK_MS = 1.0
+
+# name -> {operation: weight}
+SCENARIOS = {
+    "root": {"root": 1},
+    "progress-read": {"read": 1},
+    "progress-write": {"progress": 1},
+    "mixed": {"read": 70, "progress": 20, "submit": 10},
+}
+
+
+def operation(name, client, i, headers):
+    user = f"user-{i % USERS}"
+    auth = headers[user]
+    if name == "root":
+        return client.get("/")
+    if name == "read":
+        path = "progress" if i % 2 else "submissions"
+        return client.get(f"/users/{user}/{path}", params={"limit": 20}, headers=auth)
+    if name == "progress":
+        return client.put(f"/users/{user}/progress/lesson-{i % 40}", json={"progress": i % 101}, headers=auth)
+    if name == "submit":
+        return client.post(f"/users/{user}/labs/lab-{i % 10}/submissions", json={"payload": "flag{x}"}, headers=auth)
+    raise ValueError(f"Unknown operation: {name}")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run_scenario(client, mix, requests, concurrency, headers, seed=0):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    plan = rng.choices(names, weights, k=requests)
+    latencies = []
+    errors = 0
+
+    async def worker(offset):
+        nonlocal errors
+        for i in range(offset, requests, concurrency):
+            start = time.perf_counter()
+            response = await operation(plan[i], client, i, headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def configure_env(tmp):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["JWT_SECRET"] = SECRET
+    os.environ["RATE_LIMIT_IP"] = ""
+    os.environ["RATE_LIMIT_USER"] = ""
+    os.environ["PROFILE_DIR"] = os.path.join(tmp, "profiles")
+    os.environ.pop("REDIS_URL", None)
+    os.environ.pop("JWT_KEYS_FILE", None)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for(client, timeout=15):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get("/")
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_all(args, scenarios):
+    import httpx
+    import jwt
+
+    exp = int(time.time()) + 3600
+    headers = {
+        f"user-{n}": {"Authorization": "Bearer " + jwt.encode({"sub": f"user-{n}", "exp": exp}, SECRET)}
+        for n in range(USERS)
+    }
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+
+    async def drive(client):
+        for name, mix in scenarios.items():
+            # Warm up caches, the statement cache and connection pools.
+            await run_scenario(client, mix, min(200, args.requests), args.concurrency, headers, seed=1)
+            runs = [await run_scenario(client, mix, args.requests, args.concurrency, headers)
+                    for _ in range(args.runs)]
+            results[name] = median_result(runs)
+            print_result(name, results[name])
+
+    if args.uvicorn:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+                await wait_for(client)
+                await drive(client)
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        from app.main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as client:
+                await drive(client)
+    return results
+
+
+def median_result(runs):
+    result = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    result["errors"] = sum(run["errors"] for run in runs)
+    return result
+
+
+def print_result(name, result):
+    print(f"{name:<16} {result['throughput']:>9.0f} req/s  p50 {result['p50_ms']:7.2f} ms  "
+          f"p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  errors {result['errors']}")
+
+
+def load_baseline():
+    try:
+        with open(BASELINE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"scenarios": {}}
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance, record_command):
+    failures = []
+    for name, result in results.items():
+        if result["errors"]:
+            failures.append(f"{name}: {result['errors']} failed requests")
+        base = baseline.get(name)
+        if base is None:
+            if name == "custom":
+                print(f"{name}: ad-hoc mix, not gated")
+            else:
+                failures.append(f"{name}: no baseline recorded (run {record_command} on the reference box)")
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            failures.append(f"{name}: throughput {result['throughput']} < baseline {base['throughput']}")
+        if result["p99_ms"] > base["p99_ms"] * (1 + tolerance) + P99_SLACK_MS:
+            failures.append(f"{name}: p99 {result['p99_ms']} ms > baseline {base['p99_ms']} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios.")
+    parser.add_argument("--mix", type=parse_mix, help="Run one ad-hoc scenario with this weighted mix instead.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--uvicorn", action="store_true", help="Benchmark a locally spawned uvicorn server.")
+    parser.add_argument("--runs", type=int, default=3, help="Measure each scenario this many times.")
+    parser.add_argument("--tolerance", type=float, default=float(os.environ.get("BENCH_TOLERANCE", 0.25)))
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.mix:
+        scenarios = {"custom": args.mix}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        configure_env(tmp)
+        results = asyncio.run(run_all(args, scenarios))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Baselines are kept per transport; in-process and uvicorn numbers are
+    # not comparable.
+    transport = "uvicorn" if args.uvicorn else "asgi"
+    baseline = load_baseline()
+    recorded = baseline["scenarios"].setdefault(transport, {})
+
+    if args.update_baseline:
+        recorded.update({name: result for name, result in results.items() if name != "custom"})
+        baseline.setdefault("machine", {})[transport] = machine()
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline updated: {BASELINE}")
+        return
+
+    record_command = "make bench-baseline-uvicorn" if args.uvicorn else "make bench-baseline"
+    failures = compare(results, recorded, args.tolerance, record_command)
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Puts backend/ on sys.path so tests can import the ``app`` package.
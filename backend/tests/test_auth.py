@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+import jwt
+import pytest
+
+from app.auth import Authenticator
+
+SECRET = "test-secret-test-secret-test-secret"
+
+
+def write_keys(path, secret, kid="k1"):
+    path.write_text(json.dumps({"keys": {kid: {"alg": "HS256", "secret": secret}}}))
+
+
+def token(secret=SECRET, kid="k1", **claims):
+    claims.setdefault("sub", "alice")
+    claims.setdefault("exp", int(time.time()) + 60)
+    return jwt.encode(claims, secret, headers={"kid": kid})
+
+
+@pytest.fixture
+def keys_file(tmp_path):
+    path = tmp_path / "keys.json"
+    write_keys(path, SECRET)
+    return path
+
+
+def test_verified_tokens_are_cached(keys_file, monkeypatch):
+    auth = Authenticator(keys_file=str(keys_file))
+    value = token()
+    assert auth.verify(value)["sub"] == "alice"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached token was decoded again")
+
+    monkeypatch.setattr(jwt, "decode", fail)
+    assert auth.verify(value)["sub"] == "alice"
+
+
+def test_cache_never_outlives_exp(keys_file):
+    auth = Authenticator(keys_file=str(keys_file))
+    auth.verify(token(exp=int(time.time()) + 2))
+    (ttl, _), = auth.cache._data.values()
+    assert ttl - time.monotonic() <= 2
+
+
+def test_tokens_without_exp_are_rejected(keys_file):
+    auth = Authenticator(keys_file=str(keys_file))
+    with pytest.raises(jwt.InvalidTokenError):
+        auth.verify(jwt.encode({"sub": "alice"}, SECRET, headers={"kid": "k1"}))
+
+
+def test_rotation_drops_old_keys_and_cache(keys_file):
+    auth = Authenticator(keys_file=str(keys_file), reload_interval=0)
+    old = token()
+    auth.verify(old)
+
+    write_keys(keys_file, "rotated-secret-rotated-secret-rotated", kid="k2")
+    with pytest.raises(jwt.InvalidTokenError):
+        auth.verify(old)
+    assert auth.verify(token("rotated-secret-rotated-secret-rotated", kid="k2"))["sub"] == "alice"
+
+
+def test_rotation_within_one_mtime_tick_is_seen(keys_file):
+    auth = Authenticator(keys_file=str(keys_file), reload_interval=0)
+    old = token()
+    auth.verify(old)
+
+    # Same size, same mtime: only the inode of the renamed file differs.
+    st = os.stat(keys_file)
+    replacement = keys_file.with_suffix(".new")
+    write_keys(replacement, "x" * len(SECRET))
+    os.utime(replacement, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(replacement, keys_file)
+
+    with pytest.raises(jwt.InvalidTokenError):
+        auth.verify(old)
+    assert auth.verify(token("x" * len(SECRET)))["sub"] == "alice"
+
+
+@pytest.mark.parametrize("breakage", ["half-written", "missing"])
+def test_broken_keys_file_keeps_current_keys(keys_file, breakage):
+    auth = Authenticator(keys_file=str(keys_file), reload_interval=0)
+    cached = token()
+    auth.verify(cached)
+
+    if breakage == "missing":
+        keys_file.unlink()
+    else:
+        keys_file.write_text('{"keys": {"k1": {"alg"')
+
+    assert auth.verify(cached)["sub"] == "alice"
+    assert auth.verify(token(sub="bob"))["sub"] == "bob"
@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.cache import TAG_PREFIX, CacheEntry, LRUCache, ResponseCache
+
+
+def entry(body=b"{}", tags=()):
+    return CacheEntry(body, "application/json", 200, '"etag"', tags)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenRedis:
+    """Stands in for a Redis that is down: every command fails."""
+
+    def pipeline(self, transaction=True):
+        raise ConnectionError("redis is down")
+
+    async def delete(self, *keys):
+        raise ConnectionError("redis is down")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lru_expires_entries():
+    clock = Clock()
+    evicted = []
+    cache = LRUCache(clock=clock, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1, 10)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert evicted == ["a"]
+
+
+def test_tag_index_is_pruned_on_eviction():
+    async def scenario():
+        cache = ResponseCache(max_entries=1)
+        for n in range(4):
+            await cache.set(f"k{n}", entry(tags=("t",)))
+        assert len(cache.local) == 1
+        assert cache._tags == {"t": {"k3"}}
+        await cache.set("k3", entry(tags=("u",)))
+        assert cache._tags == {"u": {"k3"}}
+
+    asyncio.run(scenario())
+
+
+def test_redis_tag_sets_expire_with_entries():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        cache = ResponseCache(redis=redis)
+        await cache.set("k1", entry(tags=("t",)), ttl=30)
+        await cache.set("k2", entry(tags=("t",)), ttl=10)
+        ttl = await redis.pttl(TAG_PREFIX + "t")
+        assert 29_000 < ttl <= 30_000
+        assert await redis.zcard(TAG_PREFIX + "t") == 2
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_clears_both_tiers_across_workers():
+    async def scenario():
+        server = FakeServer()
+        worker_a = ResponseCache(redis=FakeAsyncRedis(server=server))
+        worker_b = ResponseCache(redis=FakeAsyncRedis(server=server))
+        await worker_a.start()
+        await worker_b.start()
+        await worker_a.set("k1", entry(b"a", tags=("lessons",)))
+        await worker_a.set("k2", entry(b"b", tags=("other",)))
+
+        # Worker B has never seen k1 locally and reads it from Redis.
+        assert (await worker_b.get("k1")).body == b"a"
+        await worker_b.invalidate("lessons")
+
+        assert await worker_b.get("k1") is None
+        assert await worker_b.redis.exists("k1", TAG_PREFIX + "lessons") == 0
+        # Worker A hears about it over pub/sub and drops its local copy.
+        for _ in range(100):
+            if worker_a.local.get("k1") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert await worker_a.get("k1") is None
+        assert (await worker_a.get("k2")).body == b"b"
+        await worker_a.close()
+        await worker_b.close()
+
+    asyncio.run(scenario())
+
+
+def test_listener_clears_local_tier_on_resubscribe():
+    async def scenario():
+        cache = ResponseCache(redis=FakeAsyncRedis())
+        await cache.start()
+        await cache.set("k1", entry(tags=("t",)))
+        # Simulate a lost subscription: the next one must not trust k1.
+        listener, cache._listener = cache._listener, None
+        listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await listener
+        await cache.start()
+        assert cache.local.get("k1") is None
+        await cache.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_down_falls_back_to_local_tier():
+    async def scenario():
+        cache = ResponseCache(redis=BrokenRedis())
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            return entry(b"x", tags=("t",))
+
+        assert (await cache.get_or_compute("k", compute)).body == b"x"
+        assert (await cache.get_or_compute("k", compute)).body == b"x"
+        assert calls == 1
+        await cache.invalidate("t")
+        assert await cache.get("k") is None
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_computes_once():
+    async def scenario():
+        cache = ResponseCache()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return entry()
+
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(20)))
+        assert calls == 1
+        assert all(result is results[0] for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_hands_over_to_waiter():
+    async def scenario():
+        cache = ResponseCache()
+        started = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.01)
+            return entry(b"done")
+
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await started.wait()
+        follower = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert (await follower).body == b"done"
+        assert calls == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    cache = ResponseCache()
+    calls = {"n": 0}
+
+    @app.get("/lessons")
+    @cache.cached(ttl=60, tags=["lessons"])
+    async def lessons(level: int = 1):
+        calls["n"] += 1
+        return {"level": level}
+
+    @app.post("/lessons/refresh")
+    async def refresh():
+        await cache.invalidate("lessons")
+
+    with TestClient(app) as client:
+        client.calls = calls
+        yield client
+
+
+def test_etag_and_304(client):
+    first = client.get("/lessons")
+    assert first.json() == {"level": 1}
+    etag = first.headers["etag"]
+
+    second = client.get("/lessons", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert client.calls["n"] == 1
+
+
+def test_keys_include_query_and_auth_scope(client):
+    client.get("/lessons", params={"level": 1, "x": 2})
+    client.get("/lessons?x=2&level=1")
+    assert client.calls["n"] == 1
+    client.get("/lessons", params={"level": 2})
+    client.get("/lessons", params={"level": 2}, headers={"Authorization": "Bearer other"})
+    assert client.calls["n"] == 3
+
+
+def test_route_invalidation(client):
+    client.get("/lessons")
+    client.post("/lessons/refresh")
+    client.get("/lessons")
+    assert client.calls["n"] == 2
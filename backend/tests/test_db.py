@@ -0,0 +1,114 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.db import Database, path_from_url
+
+SLOW_QUERY = """
+WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 2000000)
+SELECT count(*) FROM c
+"""
+
+
+def run(tmp_path, scenario, **kwargs):
+    async def main():
+        db = Database(str(tmp_path / "test.db"), **kwargs)
+        await db.open()
+        try:
+            await scenario(db)
+        finally:
+            await db.close()
+
+    asyncio.run(main())
+
+
+def test_in_memory_urls_are_rejected():
+    assert path_from_url("sqlite:///./app.db") == "./app.db"
+    for url in ("sqlite:///", "sqlite:///:memory:"):
+        with pytest.raises(ValueError, match="In-memory"):
+            path_from_url(url)
+
+
+def test_progress_updates_in_one_batch_are_coalesced(tmp_path):
+    async def scenario(db):
+        changes = db._writer.total_changes
+        await asyncio.gather(
+            db.record_progress("alice", "l1", 10),
+            db.record_progress("alice", "l1", 40),
+            db.record_progress("alice", "l2", 5),
+            db.record_progress("alice", "l1", 70),
+        )
+        assert db._writer.total_changes - changes == 2
+        page = await db.list_progress("alice")
+        assert [(item["lesson_id"], item["progress"]) for item in page.items] == [("l1", 70), ("l2", 5)]
+
+    run(tmp_path, scenario)
+
+
+def test_each_submission_gets_its_own_id(tmp_path):
+    async def scenario(db):
+        ids = await asyncio.gather(*(db.add_submission("alice", f"lab-{n}", "flag") for n in range(5)))
+        assert len(set(ids)) == 5 and ids == sorted(ids)
+        page = await db.list_submissions("alice")
+        assert [item["id"] for item in page.items] == ids
+        assert [item["lab_id"] for item in page.items] == [f"lab-{n}" for n in range(5)]
+
+    run(tmp_path, scenario)
+
+
+def test_failed_batch_fails_every_caller(tmp_path):
+    async def scenario(db):
+        results = await asyncio.gather(
+            db.record_progress("alice", "l1", 10),
+            db.add_submission("alice", "lab-1", None),
+            db.add_submission("alice", "lab-2", "flag"),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, sqlite3.IntegrityError) for result in results)
+        # The batch was rolled back as a whole, and the writer still works.
+        assert (await db.list_progress("alice")).items == []
+        assert await db.add_submission("alice", "lab-3", "flag") > 0
+
+    run(tmp_path, scenario)
+
+
+def test_keyset_pagination(tmp_path):
+    async def scenario(db):
+        for n in range(5):
+            await db.record_progress("alice", f"l{n}", n)
+            await db.add_submission("alice", "lab", f"p{n}")
+        await db.record_progress("bob", "l0", 1)
+
+        lessons, after = [], None
+        while True:
+            page = await db.list_progress("alice", after, limit=2)
+            lessons.append([item["lesson_id"] for item in page.items])
+            if page.next_cursor is None:
+                break
+            after = page.next_cursor
+        assert lessons == [["l0", "l1"], ["l2", "l3"], ["l4"]]
+
+        first = await db.list_submissions("alice", limit=3)
+        rest = await db.list_submissions("alice", first.next_cursor, limit=3)
+        assert [item["payload"] for item in first.items] == ["p0", "p1", "p2"]
+        assert [item["payload"] for item in rest.items] == ["p3", "p4"]
+        assert rest.next_cursor is None
+
+    run(tmp_path, scenario)
+
+
+def test_cancelled_read_keeps_connection_until_query_ends(tmp_path):
+    async def scenario(db):
+        task = asyncio.create_task(db._read(SLOW_QUERY, ()))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The query is still running on the only connection, so it must not
+        # be back in the pool yet; the next read waits for it.
+        assert db._readers.qsize() == 0
+        assert (await db.list_progress("alice")).items == []
+        assert db._readers.qsize() == 1
+
+    run(tmp_path, scenario, pool_size=1)
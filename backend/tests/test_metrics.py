@@ -0,0 +1,128 @@
+import asyncio
+import importlib
+import re
+import time
+
+import jwt
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.auth import DEFAULT_KID, prepare_keys
+from app.metrics import Histogram, Metrics, MetricsMiddleware
+
+SECRET = "test-secret-test-secret-test-secret"
+
+
+def sample(text, name, **labels):
+    """Value of the sample ``name{labels}`` in a rendered exposition."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}{{{re.escape(wanted)}}} (\S+)$", text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.001, 0.01, 0.1))
+    for value in (0.0005, 0.001, 0.005, 0.05, 3.0):
+        histogram.observe(value)
+    text = "\n".join(histogram.render("h"))
+    assert [sample(text, "h_bucket", le=le) for le in ("0.001", "0.01", "0.1", "+Inf")] == [2, 3, 4, 5]
+    assert sample(text, "h_count") == 5
+
+
+def test_render_labels_routes_and_status_classes():
+    app = FastAPI()
+    metrics = Metrics()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(404, "no such item")
+        return {"id": item_id}
+
+    with TestClient(app) as client:
+        for path in ("/items/1", "/items/2", "/items/0", "/nowhere"):
+            client.get(path)
+    text = metrics.render()
+
+    route = "/items/{item_id}"
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route=route, status="2xx") == 2
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route=route, status="4xx") == 1
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route="<unmatched>", status="4xx") == 1
+    assert sample(text, "http_response_size_bytes_total", method="GET", route=route, status="2xx") == len(b'{"id":1}') * 2
+    assert "/items/1" not in text
+
+
+def test_in_flight_gauge_is_per_route_and_returns_to_zero():
+    class Route:
+        path = "/slow"
+
+    release = None
+
+    async def app(scope, receive, send):
+        scope["route"] = Route
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        metrics = Metrics()
+        middleware = MetricsMiddleware(app, metrics)
+        scope = {"type": "http", "method": "GET", "path": "/slow", "headers": []}
+        requests = [asyncio.create_task(middleware(dict(scope), None, send)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert sample(metrics.render(), "http_requests_in_flight", method="GET", route="/slow") == 3
+        release.set()
+        await asyncio.gather(*requests)
+        assert sample(metrics.render(), "http_requests_in_flight", method="GET", route="/slow") == 0
+        assert metrics.active == {}
+
+    asyncio.run(scenario())
+
+
+def token(sub, **claims):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + 60, **claims}, SECRET)
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("RATE_LIMIT_IP", "")
+    monkeypatch.setenv("RATE_LIMIT_USER", "")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    module = importlib.import_module("app.main")
+    # The app is built once at import; point it at this test's state.
+    monkeypatch.setattr(module.db, "path", str(tmp_path / "test.db"))
+    monkeypatch.setattr(module.profiler, "output_dir", str(tmp_path / "profiles"))
+    module.auth.set_keys(prepare_keys({DEFAULT_KID: {"alg": "HS256", "secret": SECRET}}))
+    return module
+
+
+def test_profile_flow(main):
+    admin = {"Authorization": f"Bearer {token('root', admin=True)}"}
+    with TestClient(main.app) as client:
+        assert client.post("/admin/profile", headers={"Authorization": f"Bearer {token('alice')}"}).status_code == 403
+        assert client.post("/admin/profile", params={"duration": 0.3}, headers=admin).status_code == 202
+        assert client.post("/admin/profile", params={"duration": 0.3}, headers=admin).status_code == 409
+        assert client.get("/admin/profile", headers=admin).status_code == 409
+
+        deadline = time.monotonic() + 5
+        while main.profiler.running:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        response = client.get("/admin/profile", headers=admin)
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines
+    # Collapsed stacks: "outer;...;inner count".
+    for line in lines:
+        stack, _, count = line.rpartition(" ")
+        assert stack and int(count) > 0
+    assert any(";" in line for line in lines)
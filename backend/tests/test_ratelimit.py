@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.ratelimit import Limit, LocalLimiter, RateLimitMiddleware, settings_from_env
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenRedis:
+    async def script_load(self, script):
+        raise ConnectionError("redis is down")
+
+
+async def ok_app(scope, receive, send):
+    if scope["type"] == "websocket":
+        await send({"type": "websocket.accept"})
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def http_scope(ip="10.0.0.1", token=None, path="/", headers=()):
+    headers = list(headers)
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return {"type": "http", "path": path, "headers": headers, "client": (ip, 5000)}
+
+
+def call(middleware, scope):
+    """Run one request; return (status, headers) or the WebSocket message type."""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    first = messages[0]
+    if first["type"] in ("http.response.start", "websocket.http.response.start"):
+        return first["status"], dict(first["headers"])
+    return first["type"], first
+
+
+@pytest.fixture(params=["redis", "local"])
+def make_limiter(request):
+    redis = FakeAsyncRedis() if request.param == "redis" else None
+
+    def make(**kwargs):
+        kwargs.setdefault("clock", Clock())
+        return RateLimitMiddleware(ok_app, redis=redis, identify=lambda token: token, **kwargs)
+
+    return make
+
+
+def test_bucket_refills_and_429_has_retry_after(make_limiter):
+    clock = Clock()
+    limiter = make_limiter(ip_limit=Limit(rate=2, burst=2), clock=clock)
+    assert call(limiter, http_scope())[0] == 200
+    assert call(limiter, http_scope())[0] == 200
+
+    status, headers = call(limiter, http_scope())
+    assert status == 429
+    assert headers[b"retry-after"] == b"1"
+
+    clock.now += 0.5  # one token at 2/s
+    assert call(limiter, http_scope())[0] == 200
+    assert call(limiter, http_scope())[0] == 429
+
+
+def test_user_and_ip_limits_combine(make_limiter):
+    limiter = make_limiter(ip_limit=Limit(rate=1, burst=3), user_limit=Limit(rate=1, burst=1))
+    assert call(limiter, http_scope(token="alice"))[0] == 200
+    # Alice is out of tokens even from another address...
+    assert call(limiter, http_scope(ip="10.0.0.2", token="alice"))[0] == 429
+    # ...while the shared IP still serves other users until its own limit.
+    assert call(limiter, http_scope(token="bob"))[0] == 200
+    assert call(limiter, http_scope(token="carol"))[0] == 200
+    assert call(limiter, http_scope(token="dave"))[0] == 429
+
+
+def test_rejected_requests_do_not_consume_other_buckets(make_limiter):
+    limiter = make_limiter(ip_limit=Limit(rate=1, burst=2), user_limit=Limit(rate=1, burst=1))
+    call(limiter, http_scope(token="alice"))
+    for _ in range(5):
+        assert call(limiter, http_scope(token="alice"))[0] == 429
+    assert call(limiter, http_scope(token="bob"))[0] == 200
+
+
+def test_forwarded_for_uses_trusted_hop(make_limiter):
+    limiter = make_limiter(ip_limit=Limit(rate=1, burst=1), trusted_proxies=1)
+
+    def via_proxy(forwarded):
+        return http_scope(ip="172.16.0.1", headers=[(b"x-forwarded-for", forwarded)])
+
+    assert call(limiter, via_proxy(b"10.0.0.1"))[0] == 200
+    assert call(limiter, via_proxy(b"10.0.0.2"))[0] == 200
+    # A spoofed left-most entry does not buy a fresh bucket.
+    assert call(limiter, via_proxy(b"1.2.3.4, 10.0.0.1"))[0] == 429
+
+
+def test_websocket_handshakes_are_limited(make_limiter):
+    limiter = make_limiter(user_limit=Limit(rate=1, burst=1))
+    scope = {"type": "websocket", "path": "/labs/L/ws", "headers": [], "client": ("10.0.0.1", 1),
+             "query_string": b"token=alice"}
+    assert call(limiter, dict(scope))[0] == "websocket.accept"
+    message_type, message = call(limiter, dict(scope))
+    assert message_type == "websocket.close" and message["code"] == 1008
+
+    scope["extensions"] = {"websocket.http.response": {}}
+    assert call(limiter, dict(scope))[0] == 429
+
+
+def test_exempt_paths_skip_limits(make_limiter):
+    limiter = make_limiter(ip_limit=Limit(rate=1, burst=1), exempt=("/metrics",))
+    for _ in range(3):
+        assert call(limiter, http_scope(path="/metrics"))[0] == 200
+
+
+def test_noscript_reloads_script():
+    redis = FakeAsyncRedis()
+    limiter = RateLimitMiddleware(ok_app, redis=redis, ip_limit=Limit(rate=1, burst=1), clock=Clock())
+    assert call(limiter, http_scope())[0] == 200
+    asyncio.run(redis.script_flush())
+    assert call(limiter, http_scope())[0] == 429
+    # Still served by Redis, not the local fallback.
+    assert limiter.local._buckets == {}
+
+
+def test_falls_back_to_local_limiter_when_redis_fails():
+    limiter = RateLimitMiddleware(ok_app, redis=BrokenRedis(), ip_limit=Limit(rate=1, burst=1), clock=Clock())
+    assert call(limiter, http_scope())[0] == 200
+    assert call(limiter, http_scope())[0] == 429
+    assert limiter.local._buckets
+
+
+def test_local_limiter_evicts_idle_buckets_only():
+    limiter = LocalLimiter(max_buckets=3)
+    limit = Limit(rate=1, burst=1)
+    assert limiter.check([("busy", limit)], 0) == (True, 0)
+    for n in range(10):
+        # Spraying fresh keys must not reset the busy client's bucket.
+        limiter.check([(f"spray-{n}", limit)], 1)
+        assert limiter.check([("busy", limit)], 1)[0] is False
+    assert len(limiter._buckets) == 3
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "5/0"])
+def test_invalid_limits_are_rejected(value):
+    with pytest.raises(ValueError):
+        Limit.parse(value)
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_IP", "5/10")
+    monkeypatch.setenv("RATE_LIMIT_USER", "")
+    monkeypatch.setenv("RATE_LIMIT_TRUSTED_PROXIES", "2")
+    monkeypatch.setenv("RATE_LIMIT_WEBSOCKETS", "0")
+    settings = settings_from_env()
+    assert (settings["ip_limit"].rate, settings["ip_limit"].burst) == (5, 10)
+    assert settings["user_limit"] is None
+    assert settings["trusted_proxies"] == 2
+    assert settings["limit_websockets"] is False
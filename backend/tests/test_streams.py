@@ -0,0 +1,165 @@
+import asyncio
+import importlib
+import time
+
+import jwt
+import pytest
+from fakeredis import FakeAsyncRedis
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.auth import DEFAULT_KID, prepare_keys
+from app.streams import STREAM_PREFIX, SSEEncoder, StreamHub, Subscriber, lab_channel, sse_event
+
+SECRET = "test-secret-test-secret-test-secret"
+
+
+def data_lines(event):
+    return [line[len("data: "):] for line in event.decode().split("\n") if line.startswith("data: ")]
+
+
+def test_sse_event_normalises_line_ends():
+    assert data_lines(sse_event(b"a\r\nb\rc\nd")) == ["a", "b", "c", "d"]
+    assert b"\r" not in sse_event("progress 10%\rprogress 20%\r\n")
+
+
+def test_encoder_keeps_split_multibyte_characters():
+    data = "héllo €".encode()
+    encoder = SSEEncoder()
+    events = [encoder.encode(data[i:i + 1]) for i in range(len(data))]
+    assert "".join("".join(data_lines(event)) for event in events if event) == "héllo €"
+    assert "�" not in b"".join(events).decode()
+
+
+def test_encoder_keeps_split_crlf_as_one_line_end():
+    encoder = SSEEncoder()
+    assert data_lines(encoder.encode(b"one\r")) == ["one"]
+    assert data_lines(encoder.encode(b"\ntwo")) == ["", "two"]
+
+
+def test_drop_policy_discards_oldest():
+    subscriber = Subscriber(policy="drop", max_items=2)
+    for chunk in (b"1", b"2", b"3"):
+        subscriber.put(chunk)
+    assert asyncio.run(subscriber.get()) == [b"2", b"3"]
+    assert subscriber.dropped == 1
+
+
+def test_coalesce_policy_appends_to_newest():
+    subscriber = Subscriber(policy="coalesce", max_items=2)
+    for chunk in (b"1", b"2", b"3"):
+        subscriber.put(chunk)
+    assert asyncio.run(subscriber.get()) == [b"1", b"23"]
+    assert subscriber.dropped == 0
+
+
+def test_byte_cap_trims_oldest_output():
+    subscriber = Subscriber(max_bytes=4)
+    for chunk in (b"aa", b"bb", b"cc"):
+        subscriber.put(chunk)
+    assert asyncio.run(subscriber.get()) == [b"bb", b"cc"]
+    assert subscriber.dropped == 1
+
+
+def test_local_hub_fans_out_to_every_subscriber():
+    async def scenario():
+        hub = StreamHub()
+        first, second = hub.subscribe("c"), hub.subscribe("c")
+        await hub.publish("c", b"x")
+        assert await first.get() == [b"x"] and await second.get() == [b"x"]
+        await hub.unsubscribe("c", first)
+        await hub.unsubscribe("c", second)
+        assert hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_redis_hub_shares_one_reader_per_channel():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        hub = StreamHub(redis=redis, block_ms=50)
+        first, second = hub.subscribe("c"), hub.subscribe("c")
+        assert list(hub._readers) == ["c"]
+        reader = hub._readers["c"]
+        # Let the reader block in XREAD before publishing; it starts at "$".
+        await asyncio.sleep(0.05)
+
+        await hub.publish("c", b"line 1\n")
+        assert await redis.xlen(STREAM_PREFIX + "c") == 1
+        assert await asyncio.wait_for(first.get(), 1) == [b"line 1\n"]
+        assert await asyncio.wait_for(second.get(), 1) == [b"line 1\n"]
+
+        await hub.unsubscribe("c", first)
+        assert not reader.done()
+        await hub.unsubscribe("c", second)
+        assert reader.cancelled() and hub._readers == {}
+        await hub.close()
+
+    asyncio.run(scenario())
+
+
+def token(sub="alice", **claims):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + 60, **claims}, SECRET)
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("RATE_LIMIT_IP", "")
+    monkeypatch.setenv("RATE_LIMIT_USER", "")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    module = importlib.import_module("app.main")
+    # The app is built once at import; point it at this test's state.
+    monkeypatch.setattr(module.db, "path", str(tmp_path / "test.db"))
+    module.auth.set_keys(prepare_keys({DEFAULT_KID: {"alg": "HS256", "secret": SECRET}}))
+    return module
+
+
+@pytest.fixture
+def client(main):
+    with TestClient(main.app) as client:
+        yield client
+
+
+def bearer(value):
+    return {"Authorization": f"Bearer {value}"}
+
+
+def test_sse_requires_owner_or_staff(client):
+    path = "/users/alice/labs/lab-1/stream"
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=bearer(token("mallory"))).status_code == 403
+    assert client.get(path, headers=bearer(token("mallory", admin=False))).status_code == 403
+
+
+@pytest.mark.parametrize("claims", [{"sub": "mallory"}, {"sub": "mallory", "instructor": "yes"}])
+def test_websocket_refuses_other_users(client, claims):
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect(f"/users/alice/labs/lab-1/ws?token={token(**claims)}"):
+            pass
+    assert exc.value.code == 1008
+
+
+def test_websocket_refuses_unverifiable_tokens(client):
+    forged = jwt.encode({"sub": "alice", "exp": int(time.time()) + 60}, SECRET, headers={"kid": "gone"})
+    for value in (forged, "not-a-jwt"):
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect(f"/users/alice/labs/lab-1/ws?token={value}"):
+                pass
+        assert exc.value.code == 1008
+
+
+@pytest.mark.parametrize("viewer", [{"sub": "alice"}, {"sub": "teacher", "instructor": True},
+                                    {"sub": "root", "admin": True}])
+def test_websocket_delivers_to_owner_and_staff(main, client, viewer):
+    channel = lab_channel("alice", "lab-1")
+    with client.websocket_connect(f"/users/alice/labs/lab-1/ws?token={token(**viewer)}") as ws:
+        deadline = time.monotonic() + 5
+        while main.streams.subscriber_count(channel) == 0:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        response = client.post("/users/alice/labs/lab-1/output", content=b"$ make\n",
+                               headers={**bearer(token("root", admin=True)),
+                                        "Content-Type": "application/octet-stream"})
+        assert response.status_code == 204
+        assert ws.receive_bytes() == b"$ make\n"
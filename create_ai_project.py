@@ -1,6 +1,42 @@
+import hashlib
+import json
 import os
 from pathlib import Path
-import shutil
+
+import typer
+
+# Keep module import cheap: this CLI is invoked thousands of times from
+# scripts, so anything only some subcommands need (tempfile, thread pools,
+# requests, rich) is imported inside the function that uses it.
+# scripts/bench_startup.py guards this.
+
+DEFAULT_ROOT = 'ai-explosion-template'
+MANIFEST_NAME = '.scaffold-manifest.json'
+MAX_WORKERS = 8
+
+_umask = None
+
+def current_umask():
+    """Return the process umask, read once on first use.
+
+    Linux reports it in /proc/self/status. Elsewhere it can only be read by
+    setting it, which briefly changes it for every thread, so that is left
+    as a fallback and done at most once.
+    """
+    global _umask
+    if _umask is None:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('Umask:'):
+                        _umask = int(line.split()[1], 8)
+                        break
+        except OSError:
+            pass
+        if _umask is None:
+            _umask = os.umask(0o022)
+            os.umask(_umask)
+    return _umask
 
 def create_directory(path):
     try:
@@ -12,30 +48,154 @@ def create_directory(path):
         Path(new_path).mkdir(parents=True, exist_ok=True)
         print(f"Directory created at: {new_path}")
 
-def create_file(path, content=''):
+def write_atomic(path, content):
+    # Write to a temp file next to the target and rename it into place, so a
+    # reader never sees a half-written file.
+    import tempfile
+
+    directory = os.path.dirname(path) or '.'
     try:
-        with open(path, 'w') as f:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~current_umask()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.part')
+    try:
+        with os.fdopen(fd, 'w') as f:
             f.write(content)
+        # mkstemp creates the file as 0600; give it the mode open() would
+        # have, or keep the mode of the file being replaced. os.chmod on the
+        # closed path rather than os.fchmod, which Windows lacks before 3.13.
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def create_file(path, content=''):
+    try:
+        write_atomic(path, content)
     except PermissionError:
         print(f"Permission denied: {path}")
         print("Trying to create file in a different location...")
         new_path = os.path.join(os.path.expanduser("~"), os.path.basename(path))
-        with open(new_path, 'w') as f:
-            f.write(content)
+        write_atomic(new_path, content)
         print(f"File created at: {new_path}")
+        return None
+    return path
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def build_manifest(project_root, directories, files):
+    """Build the in-memory manifest of everything the scaffold should contain.
+
+    Directories include the parents of every file, so the apply phase never
+    has to discover them on the fly.
+    """
+    dirs = {project_root}
+    for directory in directories:
+        dirs.add(os.path.join(project_root, directory))
+    for file_path in files:
+        parent = os.path.dirname(file_path)
+        while parent and parent not in dirs:
+            dirs.add(parent)
+            parent = os.path.dirname(parent)
+    return {
+        'root': project_root,
+        'directories': sorted(dirs),
+        'files': {path: content_hash(content) for path, content in files.items()},
+    }
+
+def load_manifest(project_root):
+    try:
+        with open(os.path.join(project_root, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def setup_project():
-    # Project root structure
-    project_root = 'ai-explosion-template'
-    create_directory(project_root)
+def save_manifest(project_root, state):
+    write_atomic(os.path.join(project_root, MANIFEST_NAME), json.dumps(state, indent=2, sort_keys=True))
 
+def _read_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def plan(manifest, previous):
+    """Compare the desired manifest with what is on disk.
+
+    Returns a list of ``(action, path)`` tuples where action is ``mkdir``,
+    ``create`` or ``update``. A file recorded in ``previous`` whose size and
+    mtime still match is trusted without being read, so an unchanged tree
+    costs one ``stat`` per file. ``previous`` is keyed by paths relative to
+    the project root, so it stays valid if the tree is moved or the root is
+    given differently.
+    """
+    changes = []
+    for directory in manifest['directories']:
+        if not os.path.isdir(directory):
+            changes.append(('mkdir', directory))
+    for path, digest in manifest['files'].items():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            changes.append(('create', path))
+            continue
+        known = previous.get(os.path.relpath(path, manifest['root']))
+        if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+            if known['sha256'] != digest:
+                changes.append(('update', path))
+        elif _read_hash(path) != digest:
+            changes.append(('update', path))
+    return changes
+
+def apply(changes, files, max_workers=MAX_WORKERS):
+    for action, path in changes:
+        if action == 'mkdir':
+            create_directory(path)
+    writes = [path for action, path in changes if action != 'mkdir']
+    if not writes:
+        return []
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(writes))) as pool:
+        written = list(pool.map(lambda path: create_file(path, files[path]), writes))
+    return [path for path in written if path]
+
+def record_state(project_root, manifest, previous):
+    state = {}
+    for path, digest in manifest['files'].items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        rel = os.path.relpath(path, project_root)
+        known = previous.get(rel)
+        if known and known['sha256'] == digest and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+            state[rel] = known
+        else:
+            state[rel] = {'sha256': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    save_manifest(project_root, state)
+
+def print_diff(changes):
+    if not changes:
+        print("No changes.")
+        return
+    symbols = {'mkdir': '+d', 'create': '+', 'update': '~'}
+    for action, path in changes:
+        print(f"{symbols[action]} {path}")
+    print(f"{len(changes)} change(s) pending.")
+
+def project_files(project_root=DEFAULT_ROOT):
     directories = [
         # ... (rest of the directories remain the same)
     ]
 
-    for directory in directories:
-        create_directory(os.path.join(project_root, directory))
-
     files = {
         os.path.join(project_root, '.devcontainer', 'devcontainer.json'): '{}',
         os.path.join(project_root, '.devcontainer', 'docker-compose.yml'): '',
@@ -93,10 +253,75 @@ This is a web application that provides an educational platform focused on ethic
 '''
     }
 
-    for file_path, content in files.items():
-        create_file(file_path, content)
+    return directories, files
+
+def plan_project(project_root=DEFAULT_ROOT):
+    directories, files = project_files(project_root)
+    manifest = build_manifest(project_root, directories, files)
+    previous = load_manifest(project_root)
+    return manifest, previous, plan(manifest, previous), files
+
+def setup_project(project_root=DEFAULT_ROOT, dry_run=False):
+    manifest, previous, changes, files = plan_project(project_root)
+
+    if dry_run:
+        print_diff(changes)
+        return changes
+
+    apply(changes, files)
+    record_state(project_root, manifest, previous)
+
+    print(f"Project scaffolding complete! ({len(changes)} change(s) applied)")
+    return changes
+
+app = typer.Typer(
+    help="Scaffold and publish the AI-Explosion project template.",
+    add_completion=False,
+    # Rich help and tracebacks import rich on every invocation; plain click
+    # output keeps --help inside the startup budget.
+    rich_markup_mode=None,
+    pretty_exceptions_enable=False,
+)
+
+@app.command()
+def scaffold(
+    root: str = typer.Option(DEFAULT_ROOT, help="Directory to scaffold into."),
+    dry_run: bool = typer.Option(False, '--dry-run', help="Show what would change without writing anything."),
+):
+    """Create or update the project tree, writing only changed files."""
+    setup_project(root, dry_run=dry_run)
+
+@app.command()
+def diff(root: str = typer.Option(DEFAULT_ROOT, help="Directory to compare against.")):
+    """Show pending scaffold changes as a table; exits 1 if there are any."""
+    from rich.console import Console
+    from rich.table import Table
+
+    changes = plan_project(root)[2]
+    console = Console()
+    if not changes:
+        console.print("No changes.")
+        return
+    styles = {'mkdir': 'cyan', 'create': 'green', 'update': 'yellow'}
+    table = Table('Action', 'Path')
+    for action, path in changes:
+        table.add_row(f"[{styles[action]}]{action}[/]", path)
+    console.print(table)
+    raise typer.Exit(code=1)
+
+@app.command()
+def publish(
+    repo: str = typer.Argument(..., help="Target repository as OWNER/REPO."),
+    root: str = typer.Option(DEFAULT_ROOT, help="Scaffolded directory to push."),
+    branch: str = typer.Option('main', help="Branch to publish to."),
+    message: str = typer.Option('Scaffold project', help="Commit message."),
+    token: str = typer.Option(None, envvar='GITHUB_TOKEN', help="GitHub token."),
+):
+    """Push the scaffold to GitHub as a single commit."""
+    from publish_github import publish_project
 
-    print("Project scaffolding complete!")
+    sha = publish_project(root, repo, token=token, branch=branch, message=message)
+    print(f"Published {repo}@{branch}: {sha}")
 
 if __name__ == "__main__":
-    setup_project()
\ No newline at end of file
+    app()
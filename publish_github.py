@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = 'https://api.github.com'
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+SKIP_FILES = {'.scaffold-manifest.json'}
+
+
+class PublishError(Exception):
+    pass
+
+
+def git_blob_sha(data):
+    # Same object id git itself would assign, used to de-duplicate uploads.
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def collect_files(root):
+    """Read a scaffolded tree from disk.
+
+    Returns ``({relative_posix_path: bytes}, executables)``, where
+    ``executables`` is the set of paths with any execute bit set.
+    """
+    files = {}
+    executables = set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != '.git']
+        for name in filenames:
+            if name in SKIP_FILES:
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                files[rel] = f.read()
+                if os.fstat(f.fileno()).st_mode & 0o111:
+                    executables.add(rel)
+    return files, executables
+
+
+class GitHubPublisher:
+    """Push a whole tree to a branch as a single commit via the Git Data API.
+
+    Blobs are uploaded concurrently over one pooled session; the tree, commit
+    and ref update are one request each, so an N-file push costs N unique
+    blobs plus a constant number of calls.
+    """
+
+    def __init__(self, token, repo, api_url=API_URL, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, session=None, sleep=time.sleep):
+        self.repo = repo
+        self.api_url = api_url.rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'X-GitHub-Api-Version': '2022-11-28',
+        })
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                # An HTTP-date; not worth parsing, use the normal backoff.
+                pass
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = response.headers.get('X-RateLimit-Reset')
+            if reset is not None:
+                return max(0.0, float(reset) - time.time()) + 1
+        return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+    def _should_retry(self, response):
+        if response.status_code >= 500 or response.status_code == 429:
+            return True
+        if response.status_code == 403:
+            return ('Retry-After' in response.headers
+                    or response.headers.get('X-RateLimit-Remaining') == '0')
+        return False
+
+    def request(self, method, path, **kwargs):
+        url = f"{self.api_url}/repos/{self.repo}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=30, **kwargs)
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                self.sleep(min(60.0, 2 ** attempt) + random.uniform(0, 1))
+                continue
+            if not self._should_retry(response) or attempt == self.max_retries:
+                return response
+            self.sleep(self._retry_delay(response, attempt))
+        return response
+
+    def _json(self, method, path, expected, **kwargs):
+        response = self.request(method, path, **kwargs)
+        if response.status_code not in expected:
+            raise PublishError(f"{method} {path} failed: {response.status_code} {response.text}")
+        return response.json()
+
+    def head_commit(self, branch):
+        response = self.request('GET', f"/git/ref/heads/{branch}")
+        if response.status_code == 404:
+            return None, None
+        if response.status_code != 200:
+            raise PublishError(f"GET ref {branch} failed: {response.status_code} {response.text}")
+        commit_sha = response.json()['object']['sha']
+        commit = self._json('GET', f"/git/commits/{commit_sha}", (200,))
+        return commit_sha, commit['tree']['sha']
+
+    def upload_blobs(self, files):
+        # Identical contents share one blob, so many empty placeholders cost
+        # a single upload.
+        unique = {}
+        for data in files.values():
+            unique.setdefault(git_blob_sha(data), data)
+
+        def upload(item):
+            sha, data = item
+            try:
+                payload = {'content': data.decode('utf-8'), 'encoding': 'utf-8'}
+            except UnicodeDecodeError:
+                payload = {'content': base64.b64encode(data).decode('ascii'), 'encoding': 'base64'}
+            blob = self._json('POST', '/git/blobs', (201,), json=payload)
+            if blob['sha'] != sha:
+                raise PublishError(f"Blob sha mismatch: expected {sha}, got {blob['sha']}")
+            return sha
+
+        if unique:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique))) as pool:
+                list(pool.map(upload, unique.items()))
+        return {path: git_blob_sha(data) for path, data in files.items()}
+
+    def publish(self, files, branch='main', message='Scaffold project', executables=()):
+        """Publish ``files`` (``{path: bytes}``) as one commit on ``branch``.
+
+        Paths in ``executables`` get mode ``100755``. Returns the new commit
+        sha.
+        """
+        parent_sha, base_tree = self.head_commit(branch)
+        blob_shas = self.upload_blobs(files)
+        tree_payload = {
+            'tree': [
+                {'path': path, 'mode': '100755' if path in executables else '100644',
+                 'type': 'blob', 'sha': sha}
+                for path, sha in sorted(blob_shas.items())
+            ],
+        }
+        if base_tree:
+            tree_payload['base_tree'] = base_tree
+        tree = self._json('POST', '/git/trees', (201,), json=tree_payload)
+
+        commit = self._json('POST', '/git/commits', (201,), json={
+            'message': message,
+            'tree': tree['sha'],
+            'parents': [parent_sha] if parent_sha else [],
+        })
+        if parent_sha:
+            self._json('PATCH', f"/git/refs/heads/{branch}", (200,), json={'sha': commit['sha']})
+        else:
+            self._json('POST', '/git/refs', (201,), json={'ref': f"refs/heads/{branch}", 'sha': commit['sha']})
+        return commit['sha']
+
+
+def publish_project(root, repo, token=None, branch='main', message='Scaffold project', **kwargs):
+    token = token or os.environ.get('GITHUB_TOKEN')
+    publisher = GitHubPublisher(token, repo, **kwargs)
+    files, executables = collect_files(root)
+    return publisher.publish(files, branch=branch, message=message, executables=executables)
@@ -0,0 +1,84 @@
+"""Cold-start budget for the create_ai_project CLI.
+
+Runs the CLI under ``python -X importtime`` and fails if the cumulative
+import time exceeds the budget, or if a command pulled in a module that
+only other subcommands need.
+
+    python scripts/bench_startup.py [--budget-ms 150] [--runs 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'create_ai_project.py')
+
+# Modules only the publish/diff subcommands may load; rich only renders the
+# diff table, so --help must not pull it in either.
+HEAVY = ('github', 'nacl', 'cryptography', 'requests', 'publish_github', 'rich')
+
+SCENARIOS = [
+    # (name, argv, modules that must not be imported)
+    ('--help', ['--help'], HEAVY),
+    ('scaffold --dry-run', ['scaffold', '--dry-run', '--root', '{tmp}'], HEAVY),
+]
+
+
+def parse_importtime(stderr):
+    """Return (total cumulative microseconds, set of imported top-level packages)."""
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, _, rest = line.partition(':')
+        self_us, cumulative_us, name = rest.split('|', 2)
+        modules.add(name.strip().split('.')[0])
+        # Only top-level imports count towards the total; nested ones are
+        # already included in their parent's cumulative time.
+        if not name[1:].startswith(' '):
+            total += int(cumulative_us)
+    return total, modules
+
+
+def run(argv):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', CLI, *argv],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode not in (0, 1):
+        sys.exit(f"{' '.join(argv)} failed:\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 150)))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, argv, forbidden in SCENARIOS:
+            argv = [arg.format(tmp=tmp) for arg in argv]
+            timings = []
+            for _ in range(args.runs):
+                total_us, modules = run(argv)
+                timings.append(total_us)
+            best_ms = min(timings) / 1000
+            leaked = sorted(set(forbidden) & modules)
+            status = 'ok'
+            if best_ms > args.budget_ms:
+                status = f"over budget ({args.budget_ms:.0f} ms)"
+                failed = True
+            if leaked:
+                status = f"imports {', '.join(leaked)}"
+                failed = True
+            print(f"{name:<22} {best_ms:8.1f} ms  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import stat
+
+import create_ai_project
+from create_ai_project import MANIFEST_NAME, load_manifest, plan_project, setup_project
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_rerun_over_unchanged_tree_writes_nothing(tmp_path):
+    root = str(tmp_path / 'proj')
+    assert setup_project(root)
+    assert setup_project(root) == []
+
+
+def test_changed_file_is_planned_as_update(tmp_path):
+    root = str(tmp_path / 'proj')
+    setup_project(root)
+    with open(os.path.join(root, 'README.md'), 'a') as f:
+        f.write('local edit\n')
+    assert plan_project(root)[2] == [('update', os.path.join(root, 'README.md'))]
+
+
+def test_new_files_get_umask_mode(tmp_path):
+    root = str(tmp_path / 'proj')
+    setup_project(root)
+    expected = 0o666 & ~create_ai_project.current_umask()
+    assert mode(os.path.join(root, 'README.md')) == expected
+    assert mode(os.path.join(root, MANIFEST_NAME)) == expected
+
+
+def test_umask_is_read_without_changing_it():
+    previous = os.umask(0o027)
+    try:
+        create_ai_project._umask = None
+        assert create_ai_project.current_umask() == 0o027
+        assert os.umask(0o027) == 0o027
+    finally:
+        os.umask(previous)
+        create_ai_project._umask = None
+
+
+def test_update_keeps_existing_mode(tmp_path):
+    root = str(tmp_path / 'proj')
+    setup_project(root)
+    script = os.path.join(root, 'scripts', 'setup.sh')
+    os.chmod(script, 0o755)
+    with open(script, 'w') as f:
+        f.write('changed')
+    setup_project(root)
+    assert mode(script) == 0o755
+
+
+def test_manifest_is_relative_to_root(tmp_path, monkeypatch):
+    root = tmp_path / 'proj'
+    setup_project(str(root))
+    assert 'README.md' in load_manifest(str(root))
+
+    # Moving the tree and addressing it by absolute path still trusts the
+    # recorded stat data instead of re-reading every file.
+    moved = tmp_path / 'moved'
+    os.rename(root, moved)
+    def read_hash(path):
+        raise AssertionError(f"re-hashed {path}")
+
+    monkeypatch.setattr(create_ai_project, '_read_hash', read_hash)
+    assert plan_project(str(moved))[2] == []
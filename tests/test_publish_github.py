@@ -0,0 +1,198 @@
+import base64
+import json
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from publish_github import GitHubPublisher, PublishError, collect_files, git_blob_sha
+
+REPO = 'lab/template'
+HEAD = 'a' * 40
+BASE_TREE = 'b' * 40
+
+
+class StubGitHub(ThreadingHTTPServer):
+    """Minimal Git Data API stand-in that counts requests per route."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.failures = []
+        self.bodies = {}
+        self.has_branch = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=()):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        prefix = f"/repos/{REPO}/git/"
+        route = self.path[len(prefix):] if self.path.startswith(prefix) else self.path
+        route_name = route.split('/')[0] if not route.startswith('ref/') else 'ref'
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        server = self.server
+        with server.lock:
+            server.calls[(method, route_name)] += 1
+            server.bodies.setdefault((method, route_name), []).append(body)
+            failure = server.failures.pop(0) if server.failures and method == 'POST' and route_name == 'blobs' else None
+        if failure is not None:
+            self._reply(*failure)
+            return
+
+        if method == 'GET' and route_name == 'ref':
+            if not server.has_branch:
+                self._reply(404, {'message': 'Not Found'})
+            else:
+                self._reply(200, {'object': {'sha': HEAD}})
+        elif method == 'GET' and route_name == 'commits':
+            self._reply(200, {'sha': HEAD, 'tree': {'sha': BASE_TREE}})
+        elif method == 'POST' and route_name == 'blobs':
+            if body['encoding'] == 'base64':
+                data = base64.b64decode(body['content'])
+            else:
+                data = body['content'].encode('utf-8')
+            self._reply(201, {'sha': git_blob_sha(data)})
+        elif method == 'POST' and route_name == 'trees':
+            self._reply(201, {'sha': 'c' * 40})
+        elif method == 'POST' and route_name == 'commits':
+            self._reply(201, {'sha': 'd' * 40})
+        elif method in ('PATCH', 'POST') and route_name == 'refs':
+            self._reply(200 if method == 'PATCH' else 201, {'ref': 'refs/heads/main'})
+        else:
+            self._reply(404, {'message': 'Not Found'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+
+@pytest.fixture
+def github():
+    server = StubGitHub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def scaffold_files(n):
+    # Mostly unique files plus a run of empty placeholders, like the scaffold.
+    files = {f"src/module_{i}.py": f"value = {i}\n".encode() for i in range(n)}
+    files.update({f"docs/empty_{i}.md": b'' for i in range(n)})
+    return files
+
+
+def make_publisher(github, sleeps=None):
+    return GitHubPublisher('token', REPO, api_url=github.url, max_workers=4,
+                           sleep=(sleeps.append if sleeps is not None else lambda delay: None))
+
+
+@pytest.mark.parametrize('n', [5, 50])
+def test_commit_calls_are_constant_in_file_count(github, n):
+    files = scaffold_files(n)
+    make_publisher(github).publish(files)
+
+    unique_blobs = len({git_blob_sha(data) for data in files.values()})
+    assert github.calls[('GET', 'ref')] == 1
+    assert github.calls[('POST', 'blobs')] == unique_blobs <= len(files)
+    assert github.calls[('POST', 'trees')] == 1
+    assert github.calls[('POST', 'commits')] == 1
+    assert github.calls[('PATCH', 'refs')] == 1
+
+    tree = github.bodies[('POST', 'trees')][0]
+    assert tree['base_tree'] == BASE_TREE
+    assert len(tree['tree']) == len(files)
+    assert github.bodies[('POST', 'commits')][0]['parents'] == [HEAD]
+
+
+def test_new_branch_creates_ref(github):
+    github.has_branch = False
+    make_publisher(github).publish({'README.md': b'# hi\n'})
+    assert github.calls[('POST', 'refs')] == 1
+    assert github.calls[('PATCH', 'refs')] == 0
+    assert github.bodies[('POST', 'commits')][0]['parents'] == []
+
+
+def test_binary_content_is_sent_as_base64(github):
+    make_publisher(github).publish({'logo.png': b'\x89PNG\xff\x00'})
+    assert github.bodies[('POST', 'blobs')][0]['encoding'] == 'base64'
+
+
+def test_rate_limited_403_waits_for_reset(github):
+    reset = str(int(time.time()) + 30)
+    github.failures.append((403, {'message': 'rate limit'}, [('X-RateLimit-Remaining', '0'), ('X-RateLimit-Reset', reset)]))
+    sleeps = []
+    make_publisher(github, sleeps).publish({'README.md': b'# hi\n'})
+
+    assert github.calls[('POST', 'blobs')] == 2
+    assert len(sleeps) == 1 and 25 <= sleeps[0] <= 32
+    assert github.calls[('POST', 'commits')] == 1
+
+
+def test_429_honours_retry_after(github):
+    github.failures.append((429, {'message': 'slow down'}, [('Retry-After', '7')]))
+    sleeps = []
+    make_publisher(github, sleeps).publish({'README.md': b'# hi\n'})
+
+    assert github.calls[('POST', 'blobs')] == 2
+    assert sleeps == [7.0]
+
+
+def test_plain_403_is_not_retried(github):
+    github.failures.append((403, {'message': 'forbidden'}, []))
+    with pytest.raises(PublishError, match='403'):
+        make_publisher(github, []).publish({'README.md': b'# hi\n'})
+    assert github.calls[('POST', 'blobs')] == 1
+
+
+def test_http_date_retry_after_uses_backoff(github):
+    github.failures.append((429, {'message': 'slow down'}, [('Retry-After', 'Wed, 21 Oct 2015 07:28:00 GMT')]))
+    sleeps = []
+    make_publisher(github, sleeps).publish({'README.md': b'# hi\n'})
+
+    assert github.calls[('POST', 'blobs')] == 2
+    assert len(sleeps) == 1 and 1 <= sleeps[0] <= 2
+
+
+def test_executable_mode_comes_from_the_file(github, tmp_path):
+    (tmp_path / 'run').write_text('#!/bin/sh\n')
+    (tmp_path / 'notes.sh').write_text('not a script\n')
+    os.chmod(tmp_path / 'run', 0o755)
+    os.chmod(tmp_path / 'notes.sh', 0o644)
+    files, executables = collect_files(str(tmp_path))
+    assert executables == {'run'}
+
+    make_publisher(github).publish(files, executables=executables)
+    modes = {entry['path']: entry['mode'] for entry in github.bodies[('POST', 'trees')][0]['tree']}
+    assert modes == {'run': '100755', 'notes.sh': '100644'}